@@ -32,6 +32,7 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     'django.contrib.sites',
+    'django.contrib.postgres',
 
     # Third party apps
     'rest_framework',
@@ -93,6 +94,46 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 # Pagination
 PAGINATION_PER_PAGE = 12
 
+# Explore facet index: seconds a process keeps serving its bitmaps after another
+# process changed projects, before reloading them from the database
+FACET_INDEX_REBUILD_DELAY = 60
+
+# Cache shared by every worker when CACHE_REDIS_URL is set; the default
+# in-process cache only suits a single process. Cached listings stay correct
+# either way (their version is kept in the database), but slug redirects are
+# only invalidated across workers with a shared cache. Typeahead results are
+# never invalidated; they just expire after TYPEAHEAD_CACHE_TIMEOUT (60s).
+CACHE_REDIS_URL = config('CACHE_REDIS_URL', default='')
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+        }
+    }
+
+# Seconds a cached project listing page is kept (entries are also versioned)
+PROJECT_LIST_CACHE_TIMEOUT = 300
+
+# Seconds a former project slug lookup is cached (renames clear their entries)
+PROJECT_SLUG_REDIRECT_CACHE_TIMEOUT = 86400
+
+# Half-life of tag activity in the trending tags ranking
+TRENDING_HALF_LIFE_DAYS = 7
+
+# Trending projects: only members, comments and updates newer than this count
+TRENDING_WINDOW_DAYS = 7
+
+# Write-behind counters (workstation/buffers.py). Without a Redis URL pending
+# counts are kept per process; with one they are shared and can be flushed
+# by the flush_buffers command.
+COUNTER_BUFFER_REDIS_URL = config('COUNTER_BUFFER_REDIS_URL', default='')
+COUNTER_BUFFER_FLUSH_INTERVAL = 10  # seconds
+# Repeat views of a project by the same viewer within this window count once (0 = off)
+VIEW_DEDUPE_SECONDS = 1800
+# User.last_seen is only rewritten once it is older than this many seconds
+LAST_SEEN_GRANULARITY = 300
+
 # File Upload Settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
@@ -122,6 +163,8 @@ MIDDLEWARE = [
 
     # DJANGO-ALLAUTH
     'allauth.account.middleware.AccountMiddleware',
+
+    'workstation.middleware.UserActivityMiddleware',
 ]
 
 ROOT_URLCONF = "config.urls"
@@ -255,7 +298,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'workstation.pagination.KeysetPagination',
     'PAGE_SIZE': 12,
 }
 
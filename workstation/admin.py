@@ -6,7 +6,7 @@ from .models import *
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
     """Custom user admin"""
-    list_display = ['username', 'email', 'user_type', 'profile_completeness', 'created_at']
+    list_display = ['username', 'email', 'user_type', 'profile_completeness', 'last_seen', 'created_at']
     list_filter = ['user_type', 'created_at']
     search_fields = ['username', 'email', 'first_name', 'last_name']
 
@@ -25,6 +25,13 @@ class ProjectMembershipInline(admin.TabularInline):
     extra = 1
 
 
+class ProjectSlugHistoryInline(admin.TabularInline):
+    """Inline for former slugs, which redirect to the current one"""
+    model = ProjectSlugHistory
+    extra = 0
+    readonly_fields = ['slug', 'created_at']
+
+
 @admin.register(Project)
 class ProjectAdmin(admin.ModelAdmin):
     """Project admin"""
@@ -34,7 +41,7 @@ class ProjectAdmin(admin.ModelAdmin):
     search_fields = ['title', 'description', 'creator__username']
     prepopulated_fields = {'slug': ('title',)}
     filter_horizontal = ['tags', 'supporters']
-    inlines = [ProjectMembershipInline]
+    inlines = [ProjectMembershipInline, ProjectSlugHistoryInline]
 
     def get_queryset(self, request):
         qs = super().get_queryset(request)
@@ -83,12 +90,20 @@ class MessageAdmin(admin.ModelAdmin):
         return qs.select_related('sender', 'recipient')
 
 
+class ConversationParticipantInline(admin.TabularInline):
+    """Inline for participants and their read state"""
+    model = ConversationParticipant
+    extra = 0
+    raw_id_fields = ['user']
+
+
 @admin.register(Conversation)
 class ConversationAdmin(admin.ModelAdmin):
     """Conversation admin"""
-    list_display = ['id', 'project', 'created_at', 'updated_at']
+    list_display = ['id', 'user_low', 'user_high', 'project', 'created_at', 'updated_at']
     list_filter = ['created_at', 'updated_at']
-    filter_horizontal = ['participants']
+    raw_id_fields = ['user_low', 'user_high', 'last_message']
+    inlines = [ConversationParticipantInline]
 
 
 @admin.register(Notification)
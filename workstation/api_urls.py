@@ -8,6 +8,7 @@ router.register(r'projects', api_views.ProjectViewSet)
 router.register(r'users', api_views.UserViewSet)
 router.register(r'thoughts', api_views.ThoughtViewSet)
 router.register(r'messages', api_views.MessageViewSet, basename='message')
+router.register(r'conversations', api_views.ConversationViewSet, basename='conversation')
 router.register(r'notifications', api_views.NotificationViewSet, basename='notification')
 router.register(r'comments', api_views.CommentViewSet, basename='comment')
 router.register(r'join-requests', api_views.JoinRequestViewSet, basename='joinrequest')
@@ -19,6 +20,7 @@ urlpatterns = [
     # Custom endpoints
     path('stats/', api_views.api_stats, name='api-stats'),
     path('dashboard/', api_views.dashboard_data, name='api-dashboard'),
+    path('typeahead/', api_views.typeahead, name='api-typeahead'),
 
     # Auth endpoints (if using Django REST Framework auth)
     path('auth/', include('rest_framework.urls')),
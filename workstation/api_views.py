@@ -1,15 +1,46 @@
-from rest_framework import viewsets, filters, status
+from rest_framework import mixins, viewsets, filters, status
 from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
-from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
+from django.http import Http404, HttpResponsePermanentRedirect
+from django.db.models import F
 from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.core.cache import cache
 from .models import *
 from .serializers import *
+from .filters import ProjectFilter, UserFilter, user_facet_counts
+from .pagination import KeysetPagination
+from .counters import (
+    advance_notification_watermark, mark_conversation_read, mark_messages_read, mark_notifications_read, unread_counts,
+)
+from .caching import current_project_slug, hydrate_projects, listing_cache_key
+from .reactions import set_project_support, set_thought_like
+from .conversations import (
+    delete_conversation_for, get_or_create_conversation, inbox, inbox_conversations, member_messages, post_message,
+    set_participant_flag, thread_messages, visible_messages,
+)
+from .search import (
+    ProjectSearchFilter, TYPEAHEAD_DEFAULT_LIMIT, TYPEAHEAD_MAX_LIMIT, TYPEAHEAD_TYPES,
+    UserSearchFilter, search_messages, typeahead_suggestions,
+)
 
 
-class StandardResultsSetPagination(PageNumberPagination):
+# Support/like actions: POST toggles, PUT and DELETE ask for a state and are safe to retry
+DESIRED_STATES = {'POST': None, 'PUT': True, 'DELETE': False}
+
+
+class ProjectMoved(Exception):
+    """Raised for a former project slug; answered with a redirect"""
+
+    def __init__(self, slug):
+        super().__init__(slug)
+        self.slug = slug
+
+
+class StandardResultsSetPagination(KeysetPagination):
     page_size = 12
     page_size_query_param = 'page_size'
     max_page_size = 100
@@ -20,12 +51,34 @@ class ProjectViewSet(viewsets.ModelViewSet):
     queryset = Project.objects.all()
     permission_classes = [IsAuthenticatedOrReadOnly]
     pagination_class = StandardResultsSetPagination
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['project_type', 'stage', 'status', 'creator__user_type']
+    filter_backends = [DjangoFilterBackend, ProjectSearchFilter, filters.OrderingFilter]
+    filterset_class = ProjectFilter
     search_fields = ['title', 'description', 'short_description']
     ordering_fields = ['created_at', 'views_count', 'title']
     lookup_field = 'slug'
 
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            # Only a miss pays for the former slug lookup
+            current_slug = current_project_slug(self.kwargs[self.lookup_field])
+            if current_slug is None:
+                raise
+            raise ProjectMoved(current_slug)
+
+    def handle_exception(self, exc):
+        if not isinstance(exc, ProjectMoved):
+            return super().handle_exception(exc)
+        old_segment = f'/{self.kwargs[self.lookup_field]}/'
+        response = HttpResponsePermanentRedirect(
+            self.request.get_full_path().replace(old_segment, f'/{exc.slug}/', 1)
+        )
+        # 308 keeps the method and body of writes
+        if self.request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            response.status_code = 308
+        return response
+
     def get_serializer_class(self):
         if self.action == 'list':
             return ProjectListSerializer
@@ -33,6 +86,30 @@ class ProjectViewSet(viewsets.ModelViewSet):
             return ProjectCreateSerializer
         return ProjectDetailSerializer
 
+    def list(self, request, *args, **kwargs):
+        # Search results and numbered pages are not cached
+        params = request.query_params
+        if params.get('search') or 'page' in params:
+            return super().list(request, *args, **kwargs)
+
+        key = listing_cache_key('api-projects', params, ignore=('format',))
+        entry = cache.get(key)
+        paginator = self.paginator
+        if entry is None:
+            rows = paginator.paginate_queryset(self.filter_queryset(self.get_queryset()), request, view=self)
+            entry = {
+                'ids': [project.pk for project in rows],
+                'next': paginator.page.next_cursor,
+                'previous': paginator.page.previous_cursor,
+            }
+            cache.set(key, entry, getattr(settings, 'PROJECT_LIST_CACHE_TIMEOUT', 300))
+        else:
+            rows = hydrate_projects(entry['ids'], self.get_queryset())
+            paginator.paginate_rows(request, rows, entry['next'], entry['previous'])
+
+        serializer = self.get_serializer(rows, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
     def perform_create(self, serializer):
         project = serializer.save(creator=self.request.user)
         # Add creator as member
@@ -42,30 +119,14 @@ class ProjectViewSet(viewsets.ModelViewSet):
             role='creator'
         )
 
-    @action(detail=True, methods=['post'])
+    @action(detail=True, methods=['post', 'put', 'delete'])
     def support(self, request, slug=None):
-        """Support/unsupport a project"""
+        """Toggle support (POST), or set it explicitly with PUT/DELETE"""
         project = self.get_object()
-
-        if request.user in project.supporters.all():
-            project.supporters.remove(request.user)
-            supported = False
-        else:
-            project.supporters.add(request.user)
-            supported = True
-
-            # Create notification
-            Notification.objects.create(
-                user=project.creator,
-                notification_type='support',
-                title=f'{request.user.username} supported your project',
-                content=f'{request.user.username} is now supporting {project.title}',
-                link=f'/projects/{project.slug}/'
-            )
-
+        supported, count = set_project_support(project, request.user, DESIRED_STATES[request.method])
         return Response({
             'supported': supported,
-            'supporters_count': project.supporters.count()
+            'supporters_count': count
         })
 
     @action(detail=True, methods=['post'])
@@ -123,16 +184,26 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = StandardResultsSetPagination
     lookup_field = 'username'
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['username', 'first_name', 'last_name', 'bio']
+    filter_backends = [DjangoFilterBackend, UserSearchFilter]
+    filterset_class = UserFilter
+    search_fields = ['username', 'first_name', 'last_name', 'title', 'bio']
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        # Facet counts describe the whole result set, so only the first page carries them
+        if 'cursor' not in request.query_params:
+            searched = UserSearchFilter().filter_queryset(request, self.get_queryset(), self)
+            response.data['facets'] = user_facet_counts(request.query_params, searched)
+        return response
 
     @action(detail=True, methods=['get'])
     def projects(self, request, username=None):
         """Get user's projects"""
         user = self.get_object()
         projects = user.created_projects.all()
-        serializer = ProjectListSerializer(projects, many=True)
+        serializer = ProjectListSerializer(projects, many=True, context={'request': request})
         return Response(serializer.data)
 
     @action(detail=True, methods=['get'])
@@ -140,7 +211,7 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
         """Get user's thoughts"""
         user = self.get_object()
         thoughts = user.thoughts.all()[:20]
-        serializer = ThoughtSerializer(thoughts, many=True)
+        serializer = ThoughtSerializer(thoughts, many=True, context={'request': request})
         return Response(serializer.data)
 
 
@@ -156,44 +227,49 @@ class ThoughtViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-    @action(detail=True, methods=['post'])
+    @action(detail=True, methods=['post', 'put', 'delete'])
     def like(self, request, pk=None):
-        """Like/unlike a thought"""
+        """Toggle a like (POST), or set it explicitly with PUT/DELETE"""
         thought = self.get_object()
-
-        if request.user in thought.likes.all():
-            thought.likes.remove(request.user)
-            liked = False
-        else:
-            thought.likes.add(request.user)
-            liked = True
-
+        liked, count = set_thought_like(thought, request.user, DESIRED_STATES[request.method])
         return Response({
             'liked': liked,
-            'likes_count': thought.likes.count()
+            'likes_count': count
         })
 
 
-class MessageViewSet(viewsets.ModelViewSet):
-    """API viewset for messages"""
+class MessageViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin,
+                     mixins.ListModelMixin, viewsets.GenericViewSet):
+    """API viewset for messages; sent messages are never edited, so there is no update"""
     serializer_class = MessageSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = StandardResultsSetPagination
 
     def get_queryset(self):
-        return Message.objects.filter(
-            recipient=self.request.user
-        ) | Message.objects.filter(
-            sender=self.request.user
+        # By conversation membership: team messages have no recipient
+        return visible_messages(member_messages(self.request.user), self.request.user).select_related(
+            'sender', 'recipient'
         )
 
     def perform_create(self, serializer):
-        serializer.save(sender=self.request.user)
+        # Same path as the HTML views, so the message lands in its conversation
+        recipient = serializer.validated_data['recipient']
+        if recipient == self.request.user:
+            raise ValidationError({'recipient_id': 'You cannot send a message to yourself'})
+        conversation = get_or_create_conversation(self.request.user, recipient)
+        serializer.instance = post_message(
+            conversation,
+            self.request.user,
+            recipient,
+            serializer.validated_data['content'],
+            subject=serializer.validated_data.get('subject', '')
+        )
 
     @action(detail=False, methods=['get'])
     def inbox(self, request):
         """Get inbox messages"""
-        messages = Message.objects.filter(recipient=request.user).order_by('-created_at')
+        messages = visible_messages(member_messages(request.user).exclude(sender=request.user), request.user)
+        messages = messages.order_by('-created_at')
         page = self.paginate_queryset(messages)
         serializer = self.get_serializer(page, many=True)
         return self.get_paginated_response(serializer.data)
@@ -201,7 +277,19 @@ class MessageViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def sent(self, request):
         """Get sent messages"""
-        messages = Message.objects.filter(sender=request.user).order_by('-created_at')
+        messages = visible_messages(Message.objects.filter(sender=request.user), request.user)
+        messages = messages.order_by('-created_at')
+        page = self.paginate_queryset(messages)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Full-text search over the user's own messages"""
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            return Response({'error': 'Search query is required'}, status=status.HTTP_400_BAD_REQUEST)
+        messages = search_messages(request.user, text).select_related('sender', 'recipient')
         page = self.paginate_queryset(messages)
         serializer = self.get_serializer(page, many=True)
         return self.get_paginated_response(serializer.data)
@@ -211,12 +299,63 @@ class MessageViewSet(viewsets.ModelViewSet):
         """Mark message as read"""
         message = self.get_object()
         if message.recipient == request.user:
-            message.is_read = True
-            message.save()
+            mark_messages_read(request.user, Message.objects.filter(pk=message.pk))
             return Response({'status': 'marked_read'})
         return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
 
 
+class ConversationViewSet(viewsets.GenericViewSet):
+    """API viewset for the user's conversations"""
+    serializer_class = ConversationSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = StandardResultsSetPagination
+
+    def get_queryset(self):
+        return Conversation.objects.filter(memberships__user=self.request.user).annotate(
+            deleted_through=F('memberships__deleted_through_message_id')
+        )
+
+    def list(self, request):
+        """Inbox, most recently active first; `?archived=true` lists the archived ones"""
+        archived = request.query_params.get('archived') == 'true'
+        page = self.paginate_queryset(inbox(request.user, archived=archived))
+        serializer = self.get_serializer(inbox_conversations(page, request.user), many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def messages(self, request, pk=None):
+        """Messages of the conversation, newest first; `next` pages back to older ones"""
+        conversation = self.get_object()
+        page = self.paginate_queryset(thread_messages(conversation, conversation.deleted_through))
+        serializer = MessageSerializer(page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
+    def destroy(self, request, pk=None):
+        """Delete the conversation for the requesting user; the others keep it"""
+        delete_conversation_for(self.get_object(), request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['post'])
+    def read(self, request, pk=None):
+        """Mark the whole conversation read"""
+        count = mark_conversation_read(request.user, self.get_object())
+        return Response({'marked_read': count})
+
+    def _set_flag(self, request, flag):
+        value = set_participant_flag(self.get_object(), request.user, flag, DESIRED_STATES[request.method])
+        return Response({flag: value})
+
+    @action(detail=True, methods=['post', 'put', 'delete'])
+    def mute(self, request, pk=None):
+        """Mute, unmute or toggle notifications for the conversation"""
+        return self._set_flag(request, 'muted')
+
+    @action(detail=True, methods=['post', 'put', 'delete'])
+    def archive(self, request, pk=None):
+        """Archive, unarchive or toggle the conversation in the user's inbox"""
+        return self._set_flag(request, 'archived')
+
+
 class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     """API viewset for notifications"""
     serializer_class = NotificationSerializer
@@ -226,31 +365,35 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
         return Notification.objects.filter(user=self.request.user)
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['notifications_read_through'] = unread_counts(self.request.user)['notifications_read_through']
+        return context
+
     @action(detail=False, methods=['post'])
     def mark_all_read(self, request):
         """Mark all notifications as read"""
-        count = self.get_queryset().filter(is_read=False).update(is_read=True)
+        count = advance_notification_watermark(request.user)
         return Response({'marked_read': count})
 
     @action(detail=True, methods=['post'])
     def mark_read(self, request, pk=None):
         """Mark notification as read"""
         notification = self.get_object()
-        notification.is_read = True
-        notification.save()
+        mark_notifications_read(request.user, self.get_queryset().filter(pk=notification.pk))
         return Response({'status': 'marked_read'})
 
     @action(detail=False, methods=['get'])
     def unread_count(self, request):
         """Get unread notification count"""
-        count = self.get_queryset().filter(is_read=False).count()
-        return Response({'unread_count': count})
+        return Response({'unread_count': unread_counts(request.user)['unread_notifications']})
 
 
 class CommentViewSet(viewsets.ModelViewSet):
     """API viewset for comments"""
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = StandardResultsSetPagination
 
     def get_queryset(self):
         project_slug = self.request.query_params.get('project', None)
@@ -348,20 +491,41 @@ def api_stats(request):
     return Response(stats)
 
 
+@api_view(['GET'])
+def typeahead(request):
+    """Typo-tolerant suggestions across projects, users, tags and skills"""
+    query = request.query_params.get('q', '')
+    types = request.query_params.get('types', '')
+    types = [t for t in types.split(',') if t in TYPEAHEAD_TYPES] or TYPEAHEAD_TYPES
+
+    try:
+        limit = int(request.query_params.get('limit', TYPEAHEAD_DEFAULT_LIMIT))
+    except ValueError:
+        limit = TYPEAHEAD_DEFAULT_LIMIT
+    limit = max(1, min(limit, TYPEAHEAD_MAX_LIMIT))
+
+    return Response({
+        'query': query,
+        'results': typeahead_suggestions(query, types=types, limit=limit),
+    })
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def dashboard_data(request):
     """Get user dashboard data"""
     user = request.user
+    context = {'request': request}
+    unread = unread_counts(user)
 
     data = {
         'profile': UserSerializer(user).data,
-        'my_projects': ProjectListSerializer(user.created_projects.all()[:5], many=True).data,
-        'joined_projects': ProjectListSerializer(user.joined_projects.all()[:5], many=True).data,
-        'supported_projects': ProjectListSerializer(user.supported_projects.all()[:5], many=True).data,
-        'unread_messages': Message.objects.filter(recipient=user, is_read=False).count(),
-        'unread_notifications': Notification.objects.filter(user=user, is_read=False).count(),
-        'recent_thoughts': ThoughtSerializer(user.thoughts.all()[:5], many=True).data,
+        'my_projects': ProjectListSerializer(user.created_projects.all()[:5], many=True, context=context).data,
+        'joined_projects': ProjectListSerializer(user.joined_projects.all()[:5], many=True, context=context).data,
+        'supported_projects': ProjectListSerializer(user.supported_projects.all()[:5], many=True, context=context).data,
+        'unread_messages': unread['unread_messages'],
+        'unread_notifications': unread['unread_notifications'],
+        'recent_thoughts': ThoughtSerializer(user.thoughts.all()[:5], many=True, context=context).data,
     }
 
     return Response(data)
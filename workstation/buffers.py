@@ -0,0 +1,197 @@
+"""
+Write-behind buffers for hot counters and timestamps.
+
+Increments such as project views, and timestamps such as a user's last
+activity, are accumulated outside the database and written back in batches,
+so a busy row costs one UPDATE per flush instead of one per hit. Pending
+values live in process memory, or in a Redis hash
+shared by all processes when COUNTER_BUFFER_REDIS_URL is set. Buffers flush
+themselves every COUNTER_BUFFER_FLUSH_INTERVAL seconds on the next write, at
+process exit, and from the flush_buffers command.
+
+Pending values are lost if a process dies before flushing (or, with Redis,
+between draining a hash and writing it), which is acceptable for the
+statistics kept here.
+"""
+import atexit
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone as dt_timezone
+
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, DateTimeField, F, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Project, User
+
+FLUSH_BATCH_SIZE = 500
+
+
+class LocalStore:
+    """Pending counts in this process's memory"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def incr(self, key, member, amount):
+        with self.lock:
+            bucket = self.counts.setdefault(key, {})
+            bucket[member] = bucket.get(member, 0) + amount
+
+    def set_max(self, key, member, value):
+        with self.lock:
+            bucket = self.counts.setdefault(key, {})
+            bucket[member] = max(bucket.get(member, value), value)
+
+    def drain(self, key):
+        with self.lock:
+            return self.counts.pop(key, {})
+
+
+class RedisStore:
+    """Pending counts in Redis hashes, shared by every process"""
+    SET_MAX_SCRIPT = """
+        local current = tonumber(redis.call('HGET', KEYS[1], ARGV[1]))
+        if not current or current < tonumber(ARGV[2]) then
+            redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+        end
+    """
+
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url)
+        self.set_max_script = self.client.register_script(self.SET_MAX_SCRIPT)
+
+    def incr(self, key, member, amount):
+        self.client.hincrby(key, member, amount)
+
+    def set_max(self, key, member, value):
+        self.set_max_script(keys=[key], args=[member, value])
+
+    def drain(self, key):
+        # Move the hash aside atomically; writes during the flush start a new one
+        draining = f'{key}:draining:{uuid.uuid4().hex}'
+        try:
+            self.client.rename(key, draining)
+        except redis.ResponseError:
+            return {}
+        counts = self.client.hgetall(draining)
+        self.client.delete(draining)
+        return {int(member): int(amount) for member, amount in counts.items()}
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        url = getattr(settings, 'COUNTER_BUFFER_REDIS_URL', '')
+        _store = RedisStore(url) if url else LocalStore()
+    return _store
+
+
+class Buffer(ABC):
+    """Pending per-row values of one column, written back in batches"""
+
+    def __init__(self, model, field):
+        self.model = model
+        self.field = field
+        self.key = f'buffer:{model._meta.db_table}:{field}'
+        self.last_flush = time.monotonic()
+
+    def maybe_flush(self):
+        if time.monotonic() - self.last_flush >= getattr(settings, 'COUNTER_BUFFER_FLUSH_INTERVAL', 10):
+            self.flush()
+
+    def flush(self):
+        """Write pending values with one UPDATE per batch; returns rows touched"""
+        self.last_flush = time.monotonic()
+        pending = list(get_store().drain(self.key).items())
+        for start in range(0, len(pending), FLUSH_BATCH_SIZE):
+            batch = pending[start:start + FLUSH_BATCH_SIZE]
+            self.model.objects.filter(pk__in=[pk for pk, _ in batch]).update(
+                **{self.field: self.new_value(batch)}
+            )
+        return len(pending)
+
+    @abstractmethod
+    def new_value(self, batch):
+        """Column expression setting each row of `batch`, a list of (pk, pending value)"""
+
+
+class CounterBuffer(Buffer):
+    """Buffered increments of an integer column"""
+
+    def incr(self, pk, amount=1):
+        get_store().incr(self.key, pk, amount)
+        self.maybe_flush()
+
+    def new_value(self, batch):
+        increment = Case(*[When(pk=pk, then=Value(amount)) for pk, amount in batch], default=Value(0))
+        return F(self.field) + increment
+
+
+class TimestampBuffer(Buffer):
+    """Latest timestamp per row for a datetime column; never moves a value back"""
+
+    def touch(self, pk, when=None):
+        when = when or timezone.now()
+        get_store().set_max(self.key, pk, int(when.timestamp()))
+        self.maybe_flush()
+
+    def new_value(self, batch):
+        latest = Case(
+            *[When(pk=pk, then=Value(datetime.fromtimestamp(ts, tz=dt_timezone.utc))) for pk, ts in batch],
+            output_field=DateTimeField(),
+        )
+        # GREATEST ignores the NULL of a row that has no value yet
+        return Greatest(F(self.field), latest)
+
+
+project_views = CounterBuffer(Project, 'views_count')
+user_last_seen = TimestampBuffer(User, 'last_seen')
+
+BUFFERS = [project_views, user_last_seen]
+
+
+def flush_all():
+    return {buffer.key: buffer.flush() for buffer in BUFFERS}
+
+
+def _flush_local_counts():
+    # Counts held in Redis survive the process, local ones would be lost
+    if isinstance(_store, LocalStore):
+        flush_all()
+
+
+atexit.register(_flush_local_counts)
+
+
+def record_project_view(request, project):
+    """Count a view, once per viewer within VIEW_DEDUPE_SECONDS when that is set"""
+    window = getattr(settings, 'VIEW_DEDUPE_SECONDS', 0)
+    if window:
+        if request.user.is_authenticated:
+            viewer = f'u{request.user.pk}'
+        else:
+            viewer = request.session.session_key
+        if viewer and not cache.add(f'viewed:{project.pk}:{viewer}', 1, window):
+            return False
+    project_views.incr(project.pk)
+    return True
+
+
+def record_last_seen(user):
+    """Note the user as active now, unless the stored value is within LAST_SEEN_GRANULARITY"""
+    now = timezone.now()
+    granularity = getattr(settings, 'LAST_SEEN_GRANULARITY', 300)
+    if user.last_seen and (now - user.last_seen).total_seconds() < granularity:
+        return False
+    user_last_seen.touch(user.pk, now)
+    return True
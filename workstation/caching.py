@@ -0,0 +1,108 @@
+"""
+Versioned result cache for project listings.
+
+Listing pages are cached as ordered id lists keyed by the normalized query
+parameters and a global project version. Any change to projects, their tags
+or memberships bumps the version, which orphans every cached listing at
+once; a hit then costs one cache read plus a primary-key hydrate.
+
+The version is a database row rather than a cache key: every process reads
+the same value whatever the cache backend, and a bump made inside a
+transaction only becomes visible when it commits (and is undone if it rolls
+back), so no reader can cache pre-commit data under the new version.
+
+Former project slugs are resolved through a cached ProjectSlugHistory lookup,
+only after the current slug has missed.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from .models import Project, ProjectListingVersion, ProjectSlugHistory
+from .pagination import KeysetPage
+
+PROJECT_VERSION_PK = 1
+
+
+def project_version():
+    version = ProjectListingVersion.objects.filter(pk=PROJECT_VERSION_PK).values_list('version', flat=True).first()
+    if version is None:
+        # Start from the clock so a recreated row never reuses an old version
+        row, _ = ProjectListingVersion.objects.get_or_create(
+            pk=PROJECT_VERSION_PK, defaults={'version': int(time.time() * 1000)}
+        )
+        version = row.version
+    return version
+
+
+def bump_project_version():
+    if not ProjectListingVersion.objects.filter(pk=PROJECT_VERSION_PK).update(version=F('version') + 1):
+        project_version()
+
+
+def listing_cache_key(prefix, params, ignore=()):
+    """Order-independent cache key for a QueryDict under the current project version"""
+    items = []
+    for key in sorted(params):
+        if key in ignore:
+            continue
+        values = sorted(value for value in params.getlist(key) if value)
+        if values:
+            items.append([key, values])
+    digest = hashlib.md5(json.dumps(items).encode()).hexdigest()
+    return f'{prefix}:v{project_version()}:{digest}'
+
+
+def hydrate_projects(ids, queryset=None):
+    """Load projects by primary key, preserving the cached order"""
+    queryset = Project.objects.all() if queryset is None else queryset
+    by_id = queryset.in_bulk(ids)
+    return [by_id[id_] for id_ in ids if id_ in by_id]
+
+
+def get_cached_page(key):
+    """Rebuild a cached KeysetPage, returning (page, extra) or (None, None)"""
+    entry = cache.get(key)
+    if entry is None:
+        return None, None
+    page = KeysetPage(hydrate_projects(entry['ids']), entry['next'], entry['previous'])
+    page.total = entry['total']
+    return page, entry['extra']
+
+
+def set_cached_page(key, page, **extra):
+    cache.set(key, {
+        'ids': [project.pk for project in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+        'total': getattr(page, 'total', None),
+        'extra': extra,
+    }, getattr(settings, 'PROJECT_LIST_CACHE_TIMEOUT', 300))
+
+
+def _slug_redirect_key(slug):
+    return f'project-slug:{slug}'
+
+
+def current_project_slug(old_slug):
+    """Current slug of the project that used to live at `old_slug`, or None"""
+    key = _slug_redirect_key(old_slug)
+    slug = cache.get(key)
+    if slug is None:
+        history = ProjectSlugHistory.objects.filter(slug=old_slug).values_list('project__slug', flat=True)
+        # Unknown slugs are cached too, as ''
+        slug = history.first() or ''
+        cache.set(key, slug, getattr(settings, 'PROJECT_SLUG_REDIRECT_CACHE_TIMEOUT', 86400))
+    return slug or None
+
+
+def record_slug_change(project, old_slug):
+    """Redirect `old_slug` and every earlier slug of the project to its current one"""
+    ProjectSlugHistory.objects.filter(slug=project.slug).delete()
+    ProjectSlugHistory.objects.update_or_create(slug=old_slug, defaults={'project': project})
+    old_slugs = project.slug_history.values_list('slug', flat=True)
+    cache.delete_many([_slug_redirect_key(slug) for slug in [*old_slugs, project.slug]])
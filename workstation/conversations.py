@@ -0,0 +1,226 @@
+"""
+Conversations and their messages.
+
+Every message carries its conversation, so a thread is a single range scan
+of the (conversation, created_at, id) index. Threads are read newest first
+with keyset cursors: the first page holds the latest messages and each
+"older" cursor continues back through the history.
+
+One-to-one conversations are keyed by their (user_low, user_high) pair, so
+finding or starting one is a single lookup on a unique index. A project's
+team conversation is keyed by the project and follows its memberships; a
+message to it has no recipient and is stored once, however large the team.
+
+Each participant's view of a conversation (read watermark, unread count,
+muted, archived) lives on its ConversationParticipant row, next to a copy of
+the conversation's last activity time, so the inbox is one scan of the
+user's rows on the inbox index, joined to their conversations.
+
+Deleting a conversation only marks the user's row, so it returns at once;
+the history up to that point stays out of their thread. Messages every
+participant has deleted are removed later by purge_deleted_messages(), in
+small batches, from the purge_conversations command.
+"""
+from django.db import transaction
+from django.db.models import Case, Exists, Min, OuterRef, Q, Value, When
+from django.db.models.functions import Greatest
+
+from .counters import FANOUT_BATCH_SIZE, latest_message_id, mark_conversation_read
+from .models import Conversation, ConversationParticipant, Message, Notification, ProjectMembership
+
+
+def get_or_create_conversation(user1, user2):
+    """
+    The one-to-one conversation of two users, created on first use.
+
+    Looked up by the canonical (user_low, user_high) pair on its unique
+    index. Concurrent first messages race on that index: the loser's INSERT
+    waits for the winner to commit, fails, and get_or_create() then reads
+    the winner's row, participants included.
+    """
+    low, high = sorted([user1.pk, user2.pk])
+    with transaction.atomic():
+        conversation, created = Conversation.objects.get_or_create(user_low_id=low, user_high_id=high)
+        if created:
+            conversation.participants.add(low, high)
+    return conversation
+
+
+def add_participants(conversation, user_ids):
+    """Add users to the conversation with its current history already read"""
+    watermark = conversation.last_message_id or 0
+    ConversationParticipant.objects.bulk_create(
+        [ConversationParticipant(conversation=conversation, user_id=user_id, last_read_message_id=watermark,
+                                 last_activity_at=conversation.updated_at)
+         for user_id in user_ids],
+        batch_size=FANOUT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def get_or_create_project_conversation(project):
+    """The team conversation of a project, created with every member on first use"""
+    with transaction.atomic():
+        conversation, created = Conversation.objects.get_or_create(project=project)
+        if created:
+            members = ProjectMembership.objects.filter(project=project).values_list('user_id', flat=True)
+            add_participants(conversation, members)
+    return conversation
+
+
+def inbox(user, archived=False):
+    """The user's conversation rows, most recently active first, for KeysetPaginator"""
+    return ConversationParticipant.objects.filter(user=user, archived=archived, deleted=False).select_related(
+        'conversation__last_message', 'conversation__user_low', 'conversation__user_high', 'conversation__project'
+    ).order_by('-last_activity_at')
+
+
+def inbox_conversations(memberships, user):
+    """Conversations of inbox() rows, each with the user's other_user, unread_count, muted and archived"""
+    conversations = []
+    for membership in memberships:
+        conversation = membership.conversation
+        conversation.other_user = conversation.get_other_user(user)
+        conversation.unread_count = membership.unread_count
+        conversation.muted = membership.muted
+        conversation.archived = membership.archived
+        conversations.append(conversation)
+    return conversations
+
+
+def set_participant_flag(conversation, user, flag, value=None):
+    """Set the user's `muted` or `archived` flag (toggle when `value` is None); returns the new value"""
+    memberships = ConversationParticipant.objects.filter(conversation=conversation, user=user)
+    if value is None:
+        value = Case(When(**{flag: True}, then=Value(False)), default=Value(True))
+    memberships.update(**{flag: value})
+    return memberships.values_list(flag, flat=True).first()
+
+
+def thread_messages(conversation, deleted_through=0):
+    """Messages of a conversation after the reader's `deleted_through` id, newest first"""
+    return conversation.messages.filter(
+        pk__gt=deleted_through
+    ).select_related('sender', 'recipient').order_by('-created_at')
+
+
+def touch_participants(conversation, at):
+    """Move every participant's last_activity_at up to `at`, FANOUT_BATCH_SIZE rows per UPDATE"""
+    memberships = ConversationParticipant.objects.filter(conversation=conversation, last_activity_at__lt=at)
+    pks = list(memberships.values_list('pk', flat=True))
+    for start in range(0, len(pks), FANOUT_BATCH_SIZE):
+        memberships.filter(pk__in=pks[start:start + FANOUT_BATCH_SIZE]).update(last_activity_at=at)
+
+
+def member_messages(user):
+    """Messages of every conversation `user` takes part in, team messages included"""
+    conversations = ConversationParticipant.objects.filter(user=user).values('conversation_id')
+    return Message.objects.filter(conversation__in=conversations)
+
+
+def visible_messages(messages, user):
+    """`messages` without those `user` deleted along with their conversation"""
+    deleted = ConversationParticipant.objects.filter(
+        conversation_id=OuterRef('conversation_id'), user=user, deleted_through_message_id__gte=OuterRef('pk')
+    )
+    return messages.exclude(Exists(deleted))
+
+
+def delete_conversation_for(conversation, user):
+    """Delete the conversation for `user` alone: one write to their row, nothing removed yet"""
+    with transaction.atomic():
+        memberships = ConversationParticipant.objects.filter(conversation=conversation, user=user)
+        if not memberships.select_for_update().exists():
+            return 0
+        # Both watermarks come from this one read, taken under the row lock
+        latest = latest_message_id(conversation)
+        mark_conversation_read(user, conversation, through=latest)
+        Conversation.objects.filter(pk=conversation.pk).update(purge_pending=True)
+        return memberships.update(
+            deleted=True,
+            archived=False,
+            deleted_through_message_id=Greatest('deleted_through_message_id', Value(latest)),
+        )
+
+
+PURGE_BATCH_SIZE = 500
+
+
+def purge_deleted_messages(batch_size=PURGE_BATCH_SIZE, max_batches=None):
+    """
+    Remove messages that every participant of their conversation has
+    deleted, `batch_size` per transaction and at most `max_batches` batches.
+    Returns the number of messages removed.
+
+    Only conversations marked purge_pending are looked at, so a run costs
+    what was deleted since the last one rather than all past deletions.
+    """
+    pending = Conversation.objects.filter(purge_pending=True).values_list('pk', flat=True)
+    removed = batches = 0
+    for conversation_id in pending.iterator():
+        if max_batches is not None and batches >= max_batches:
+            break
+        # Cleared before reading the watermarks, so a deletion made meanwhile marks it again
+        Conversation.objects.filter(pk=conversation_id).update(purge_pending=False)
+        purge_through = ConversationParticipant.objects.filter(conversation_id=conversation_id).aggregate(
+            through=Min('deleted_through_message_id')
+        )['through']
+        if not purge_through:
+            continue
+        purgeable = Message.objects.filter(conversation_id=conversation_id, pk__lte=purge_through)
+        while True:
+            if max_batches is not None and batches >= max_batches:
+                # Out of batches part way through: leave the rest for the next run
+                Conversation.objects.filter(pk=conversation_id).update(purge_pending=True)
+                break
+            with transaction.atomic():
+                pks = list(purgeable.order_by('pk').values_list('pk', flat=True)[:batch_size])
+                if not pks:
+                    break
+                Message.objects.filter(pk__in=pks).delete()
+            removed += len(pks)
+            batches += 1
+    return removed
+
+
+def post_message(conversation, sender, recipient, content, subject=''):
+    """
+    Add a message to the conversation and notify the recipient. Messages to
+    a team conversation pass no recipient; participants see them through
+    their unread counts rather than a notification each.
+
+    This is the only place message notifications are sent, so every way of
+    sending a message (views, API) must come through here.
+    """
+    with transaction.atomic():
+        message = Message.objects.create(
+            conversation=conversation,
+            sender=sender,
+            recipient=recipient,
+            subject=subject,
+            content=content
+        )
+        Conversation.objects.filter(pk=conversation.pk).update(
+            last_message=message,
+            updated_at=message.created_at
+        )
+        # New activity brings an archived or deleted conversation back to the inbox
+        ConversationParticipant.objects.filter(
+            Q(archived=True) | Q(deleted=True), conversation=conversation
+        ).update(archived=False, deleted=False, last_activity_at=message.created_at)
+    conversation.last_message = message
+    conversation.updated_at = message.created_at
+    touch_participants(conversation, message.created_at)
+
+    if recipient is None:
+        return message
+    if ConversationParticipant.objects.filter(conversation=conversation, user=recipient, muted=True).exists():
+        return message
+    Notification.objects.create(
+        user=recipient,
+        notification_type='message',
+        title='New message',
+        content=f'{sender.username} sent you a message',
+        link=f'/conversations/{conversation.id}/'
+    )
+    return message
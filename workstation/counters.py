@@ -0,0 +1,344 @@
+"""
+Denormalized relationship counters.
+
+Counter columns are moved from signals by one UPDATE adding the change's
+delta, F(column) + n, so the write costs the same however many related rows
+there are and concurrent changes add up rather than overwrite each other.
+Counts are not exact by construction, though: writes that bypass signals
+(queryset.delete() on a through table, raw SQL) or race on the same m2m
+pair leave drift, which reconcile_counters() finds and repairs with the
+COUNT(*) form of each counter.
+
+UserCounters holds each user's unread message and notification counts, so a
+badge is one primary key lookup. Creates and deletes move them from signals;
+read transitions go through mark_messages_read() and
+mark_notifications_read(), which flip the rows and move the counter in one
+transaction. Notifications are read in bulk by moving the user's
+notifications_read_through watermark, a one-row write; per-row is_read flags
+only record notifications read out of order above it.
+
+Each ConversationParticipant keeps the user's unread count for that
+conversation beside a last_read_message_id watermark. A new message counts
+against the row of every other participant still below it, after the
+message commits and FANOUT_BATCH_SIZE rows per UPDATE, so a post to a large
+project team holds no long transaction. mark_conversation_read() moves the
+watermark to the latest message and clears the count in one write.
+
+User.profile_completeness depends on the skill and interest counters, so it
+is rescored in the same UPDATE whenever they move or are recounted.
+recompute_profile_completeness() rescores every user after the weights in
+User.COMPLETENESS_WEIGHTS change.
+"""
+import operator
+from collections import Counter
+from functools import reduce
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Max, Min, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest, Length
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+
+from .models import (
+    Comment, Conversation, ConversationParticipant, Message, Notification, Project, ProjectMembership, ProjectUpdate,
+    Thought, User, UserCounters,
+)
+
+# model -> counter column -> (related model, its foreign key column to model[, filters[, exclusion Q] on related])
+# The filters may correlate the column with something other than the primary key
+COUNTERS = {
+    Project: {
+        'supporters_count': (Project.supporters.through, 'project_id'),
+        'members_count': (ProjectMembership, 'project_id'),
+        'comments_count': (Comment, 'project_id'),
+        'updates_count': (ProjectUpdate, 'project_id'),
+    },
+    Thought: {
+        'likes_count': (Thought.likes.through, 'thought_id'),
+    },
+    User: {
+        'skills_count': (User.skills.through, 'user_id'),
+        'interests_count': (User.interests.through, 'user_id'),
+    },
+    UserCounters: {
+        'unread_messages': (Message, 'recipient_id', {'is_read': False}),
+        'unread_notifications': (
+            Notification, 'user_id', {'is_read': False, 'pk__gt': OuterRef('notifications_read_through')},
+        ),
+    },
+    ConversationParticipant: {
+        # Messages read out of order above the watermark are no longer counted
+        'unread_count': (Message, 'conversation_id', {
+            'conversation_id': OuterRef('conversation_id'),
+            'pk__gt': OuterRef('last_read_message_id'),
+        }, Q(sender_id=OuterRef('user_id')) | Q(recipient_id=OuterRef('user_id'), is_read=True)),
+    },
+}
+
+
+FANOUT_BATCH_SIZE = 1000
+
+
+def _count(related, column, filters=None, exclusions=None):
+    counts = related.objects.filter(
+        **{column: OuterRef('pk'), **(filters or {})}
+    ).exclude(exclusions or Q()).order_by().values(column).annotate(n=Count('pk')).values('n')
+    return Coalesce(Subquery(counts), 0)
+
+
+def profile_completeness_expression(**values):
+    """
+    SQL version of User.compute_profile_completeness(). `values` replaces
+    columns by expressions, e.g. a counter by the COUNT that refreshes it.
+    """
+    def filled(name):
+        value = values.get(name, F(name))
+        if isinstance(User._meta.get_field(name), IntegerField):
+            return value
+        return Length(value)
+
+    cases = []
+    for names, weight in User.COMPLETENESS_WEIGHTS:
+        amount = filled(names[0]) if len(names) == 1 else Greatest(*[filled(name) for name in names])
+        cases.append(Case(When(GreaterThan(amount, 0), then=Value(weight)), default=Value(0)))
+    return reduce(operator.add, cases)
+
+
+def _counter_updates(model, fields):
+    updates = {field: _count(*COUNTERS[model][field]) for field in fields}
+    if model is User:
+        updates['profile_completeness'] = profile_completeness_expression(**updates)
+    return updates
+
+
+def adjust_counters(model, pks, field, delta):
+    """Move a counter of the given rows by `delta` in a single UPDATE; a delta of None resets it to 0"""
+    pks = list(pks)
+    if not pks or delta == 0:
+        return 0
+    updates = {field: Value(0) if delta is None else F(field) + delta}
+    if model is User:
+        # SET evaluates every expression against the old row, so rescore from the moved counter
+        updates['profile_completeness'] = profile_completeness_expression(**updates)
+    return model.objects.filter(pk__in=pks).update(**updates)
+
+
+def refresh_counters(model, pks, fields=None):
+    """Recount counters of the given rows in a single UPDATE"""
+    pks = list(pks)
+    if not pks:
+        return 0
+    fields = fields or list(COUNTERS[model])
+    return model.objects.filter(pk__in=pks).update(**_counter_updates(model, fields))
+
+
+def reconcile_counters(batch_size=10000, dry_run=False):
+    """
+    Find and repair counters that disagree with their tables.
+
+    Rows are checked in primary key ranges of `batch_size`, each range with
+    one UPDATE per counter restricted to the drifted rows. Returns a mapping
+    of 'Model.field' to the number of rows found out of sync.
+    """
+    # Users whose counters row was never created, e.g. after a bulk_create of messages
+    missing = list(User.objects.filter(counters__isnull=True).values_list('pk', flat=True))
+    drift = {'UserCounters.rows': len(missing)}
+    if not dry_run:
+        UserCounters.objects.bulk_create(
+            [UserCounters(user_id=pk) for pk in missing], batch_size=batch_size, ignore_conflicts=True
+        )
+
+    for model, counters in COUNTERS.items():
+        last_pk = model.objects.aggregate(last=Max('pk'))['last'] or 0
+        for field, spec in counters.items():
+            label = f'{model.__name__}.{field}'
+            drift[label] = 0
+            for start in range(0, last_pk + 1, batch_size):
+                rows = model.objects.filter(pk__gte=start, pk__lt=start + batch_size)
+                drifted = rows.annotate(actual=_count(*spec)).exclude(**{field: F('actual')})
+                if dry_run:
+                    drift[label] += drifted.count()
+                else:
+                    drift[label] += model.objects.filter(pk__in=drifted.values('pk')).update(
+                        **_counter_updates(model, [field])
+                    )
+    return drift
+
+
+def recompute_profile_completeness(batch_size=10000, dry_run=False):
+    """
+    Rescore profile completeness from the stored columns, in primary key
+    ranges of `batch_size`. Returns the number of users whose score changed.
+    """
+    score = profile_completeness_expression()
+    last_pk = User.objects.aggregate(last=Max('pk'))['last'] or 0
+    changed = 0
+    for start in range(0, last_pk + 1, batch_size):
+        rows = User.objects.filter(pk__gte=start, pk__lt=start + batch_size)
+        stale = rows.annotate(score=score).exclude(profile_completeness=F('score'))
+        if dry_run:
+            changed += stale.count()
+        else:
+            changed += User.objects.filter(pk__in=stale.values('pk')).update(profile_completeness=score)
+    return changed
+
+
+def adjust_unread(user_id, field, delta, **conditions):
+    """Move one of a user's UserCounters columns by `delta`, if the row matches `conditions`"""
+    if UserCounters.objects.filter(pk=user_id, **conditions).update(**{field: F(field) + delta}) or delta < 0:
+        return
+    # First unread item for the user: start the row from an exact count
+    UserCounters.objects.bulk_create([UserCounters(user_id=user_id)], ignore_conflicts=True)
+    refresh_counters(UserCounters, [user_id])
+
+
+def _mark_read(queryset, user, field, **values):
+    with transaction.atomic():
+        # The UPDATE's row count is exact even when another request marks the same rows
+        count = queryset.filter(is_read=False).update(is_read=True, **values)
+        if count:
+            adjust_unread(user.pk, field, -count)
+    return count
+
+
+def mark_messages_read(user, messages):
+    """
+    Mark the unread messages to `user` among `messages` read; returns how
+    many. Messages above the user's read watermark in their conversation
+    were counted there too, and come off its unread_count.
+    """
+    messages = messages.filter(recipient=user, is_read=False)
+    with transaction.atomic():
+        # Participant rows before messages, the order mark_conversation_read() locks them in
+        watermarks = dict(ConversationParticipant.objects.select_for_update().filter(
+            user=user, conversation__in=messages.values('conversation_id')
+        ).values_list('conversation_id', 'last_read_message_id'))
+        # Locked, so the rows flipped below are exactly these
+        rows = list(messages.select_for_update().values_list('pk', 'conversation_id'))
+        if not rows:
+            return 0
+        count = _mark_read(Message.objects.filter(pk__in=[pk for pk, _ in rows]), user, 'unread_messages',
+                           read_at=timezone.now())
+        counted = Counter(
+            conversation_id for pk, conversation_id in rows
+            if conversation_id in watermarks and pk > watermarks[conversation_id]
+        )
+        for conversation_id, n in counted.items():
+            ConversationParticipant.objects.filter(conversation_id=conversation_id, user=user).update(
+                unread_count=F('unread_count') - n
+            )
+    return count
+
+
+def _locked_watermark(user):
+    watermark = UserCounters.objects.select_for_update().filter(
+        pk=user.pk
+    ).values_list('notifications_read_through', flat=True)
+    return watermark.first() or 0
+
+
+def mark_notifications_read(user, notifications):
+    """Mark the unread notifications of `user` among `notifications` read; returns how many"""
+    with transaction.atomic():
+        # Rows under the watermark are read already and were never counted
+        watermark = _locked_watermark(user)
+        return _mark_read(notifications.filter(user=user, pk__gt=watermark), user, 'unread_notifications')
+
+
+def advance_notification_watermark(user, shown=None):
+    """
+    Move the read watermark to the user's latest notification; returns how
+    many were newly read. With `shown`, the ids of the notifications the user
+    was shown, it only moves as far as every unread notification below it
+    was shown, and the shown ones above that are marked read one by one.
+    """
+    with transaction.atomic():
+        counters, _ = UserCounters.objects.select_for_update().get_or_create(user=user)
+        watermark = counters.notifications_read_through
+        notifications = Notification.objects.filter(user=user)
+        if shown is None:
+            latest = notifications.order_by('-created_at', '-id').values_list('pk', flat=True).first()
+        else:
+            shown = list(shown)
+            latest = max(shown, default=None)
+            # Stop below the first unread notification the user hasn't seen
+            skipped = unread_notifications(user, watermark).exclude(pk__in=shown).aggregate(first=Min('pk'))
+            if latest is not None and skipped['first'] is not None:
+                latest = min(latest, skipped['first'] - 1)
+        newly_read = 0
+        if latest is not None and latest > watermark:
+            # Subtracted rather than zeroed, so increments waiting on the lock still land
+            newly_read = notifications.filter(is_read=False, pk__gt=watermark, pk__lte=latest).count()
+            UserCounters.objects.filter(pk=user.pk).update(
+                notifications_read_through=latest,
+                unread_notifications=F('unread_notifications') - newly_read,
+            )
+            watermark = latest
+        if shown:
+            newly_read += _mark_read(notifications.filter(pk__in=shown, pk__gt=watermark), user, 'unread_notifications')
+    return newly_read
+
+
+def unread_notifications(user, watermark):
+    """Unread notifications of a user, given their read watermark"""
+    return Notification.objects.filter(user=user, is_read=False, pk__gt=watermark)
+
+
+def unread_counts(user):
+    """Unread counts and notification read watermark of a user, from one primary key lookup"""
+    counts = UserCounters.objects.filter(pk=user.pk).values(
+        'unread_messages', 'unread_notifications', 'notifications_read_through'
+    )
+    return counts.first() or {'unread_messages': 0, 'unread_notifications': 0, 'notifications_read_through': 0}
+
+
+def adjust_conversation_unread(conversation_id, sender_id, message_id, delta, read_by=None):
+    """
+    Move unread_count by `delta` for every participant but the sender (and
+    `read_by`, who read the message out of order) whose watermark is below
+    the message; returns the number of rows matched.
+    """
+    memberships = ConversationParticipant.objects.filter(
+        conversation_id=conversation_id, last_read_message_id__lt=message_id
+    ).exclude(user_id__in=[sender_id, read_by])
+    pks = list(memberships.values_list('pk', flat=True))
+    for start in range(0, len(pks), FANOUT_BATCH_SIZE):
+        # The watermark is checked again under each row's lock, so a concurrent read wins
+        memberships.filter(pk__in=pks[start:start + FANOUT_BATCH_SIZE]).update(
+            unread_count=F('unread_count') + delta
+        )
+    return len(pks)
+
+
+def latest_message_id(conversation):
+    """Id of the conversation's latest message, 0 if it has none"""
+    latest = Conversation.objects.filter(pk=conversation.pk).values_list('last_message_id', flat=True).first()
+    if latest is None:
+        # last_message is cleared when that message is deleted
+        latest = conversation.messages.aggregate(latest=Max('pk'))['latest']
+    return latest or 0
+
+
+def mark_conversation_read(user, conversation, through=None):
+    """
+    Move the user's watermark in the conversation to `through`, by default
+    its latest message; returns how many were unread. Callers passing
+    `through` must have read it while holding the participant row lock.
+    """
+    with transaction.atomic():
+        membership = ConversationParticipant.objects.select_for_update().filter(
+            conversation=conversation, user=user
+        ).first()
+        if membership is None:
+            return 0
+        latest = through
+        if latest is None:
+            # Read under the row lock: a message counted against it has committed its conversation update too
+            latest = latest_message_id(conversation)
+        if not latest or latest <= membership.last_read_message_id:
+            return 0
+        ConversationParticipant.objects.filter(pk=membership.pk).update(last_read_message_id=latest, unread_count=0)
+        mark_messages_read(user, conversation.messages.filter(
+            pk__gt=membership.last_read_message_id, pk__lte=latest
+        ))
+    return membership.unread_count
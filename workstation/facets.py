@@ -0,0 +1,350 @@
+"""
+In-memory bitmap index over project facets for the explore page.
+
+Every facet value (a stage, a status, a tag...) maps to a bitmap of project
+ids. Filters become bitwise AND/OR over bitmaps, facet counts are popcounts,
+and SQL is only used to hydrate the ids of the page being shown.
+
+Bitmaps are roaring-style: ids are split into 2**16-wide chunks and each
+chunk is stored as a Python int, so sparse values stay small and the set
+operations run in C. The index lives in each process and is patched from
+model signals once their transaction commits. It records the project listing
+version it was built from and is rebuilt in the background once that shared
+version has moved on for FACET_INDEX_REBUILD_DELAY seconds, which picks up
+changes committed by other processes without reloading on every write.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+
+from .caching import project_version
+from .models import Project, Tag
+from .pagination import KeysetPage, InvalidCursor, cursor_for, decode_cursor
+
+CHUNK_BITS = 16
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+# Facet name -> Project column (tags are handled separately)
+SCALAR_FACETS = {
+    'stage': 'stage',
+    'status': 'status',
+    'project_type': 'project_type',
+    'collaboration_needed': 'collaboration_needed',
+    'user_type': 'creator_user_type',
+}
+FACETS = tuple(SCALAR_FACETS) + ('tags',)
+
+
+class Bitmap:
+    """Compressed set of non-negative integer ids"""
+    __slots__ = ('chunks',)
+
+    def __init__(self, chunks=None):
+        self.chunks = chunks or {}
+
+    @classmethod
+    def from_ids(cls, ids):
+        bitmap = cls()
+        for id_ in ids:
+            bitmap.add(id_)
+        return bitmap
+
+    def add(self, id_):
+        key = id_ >> CHUNK_BITS
+        self.chunks[key] = self.chunks.get(key, 0) | (1 << (id_ & CHUNK_MASK))
+
+    def discard(self, id_):
+        key = id_ >> CHUNK_BITS
+        chunk = self.chunks.get(key, 0) & ~(1 << (id_ & CHUNK_MASK))
+        if chunk:
+            self.chunks[key] = chunk
+        else:
+            self.chunks.pop(key, None)
+
+    def __contains__(self, id_):
+        return bool(self.chunks.get(id_ >> CHUNK_BITS, 0) >> (id_ & CHUNK_MASK) & 1)
+
+    def __and__(self, other):
+        small, large = sorted((self.chunks, other.chunks), key=len)
+        chunks = {}
+        for key, chunk in small.items():
+            both = chunk & large.get(key, 0)
+            if both:
+                chunks[key] = both
+        return Bitmap(chunks)
+
+    def __or__(self, other):
+        chunks = dict(self.chunks)
+        for key, chunk in other.chunks.items():
+            chunks[key] = chunks.get(key, 0) | chunk
+        return Bitmap(chunks)
+
+    def __len__(self):
+        return sum(chunk.bit_count() for chunk in self.chunks.values())
+
+    def __bool__(self):
+        return bool(self.chunks)
+
+    def iter_desc(self, before=None):
+        """Ids in descending order, optionally only those below `before`"""
+        for key in sorted(self.chunks, reverse=True):
+            chunk = self.chunks[key]
+            if before is not None:
+                if key > before >> CHUNK_BITS:
+                    continue
+                if key == before >> CHUNK_BITS:
+                    chunk &= (1 << (before & CHUNK_MASK)) - 1
+            base = key << CHUNK_BITS
+            while chunk:
+                bit = chunk.bit_length() - 1
+                yield base + bit
+                chunk ^= 1 << bit
+
+    def iter_asc(self, after=None):
+        """Ids in ascending order, optionally only those above `after`"""
+        for key in sorted(self.chunks):
+            chunk = self.chunks[key]
+            if after is not None:
+                if key < after >> CHUNK_BITS:
+                    continue
+                if key == after >> CHUNK_BITS:
+                    chunk &= ~((1 << ((after & CHUNK_MASK) + 1)) - 1)
+            base = key << CHUNK_BITS
+            while chunk:
+                low = chunk & -chunk
+                yield base + low.bit_length() - 1
+                chunk ^= low
+
+
+class FacetIndex:
+    """Bitmaps of project ids per facet value"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.all = Bitmap()
+        self.values = {facet: defaultdict(Bitmap) for facet in SCALAR_FACETS}
+        self.tags = defaultdict(Bitmap)  # tag id -> projects
+        self.tag_slugs = {}  # slug -> tag id
+        self.version = None
+
+    def build(self, version):
+        """Load every project and tag assignment from the database as of listing `version`"""
+        all_ids = Bitmap()
+        values = {facet: defaultdict(Bitmap) for facet in SCALAR_FACETS}
+        tags = defaultdict(Bitmap)
+
+        columns = list(SCALAR_FACETS.values())
+        for row in Project.objects.order_by().values_list('id', *columns).iterator(chunk_size=10000):
+            project_id = row[0]
+            all_ids.add(project_id)
+            for facet, value in zip(SCALAR_FACETS, row[1:]):
+                values[facet][value].add(project_id)
+
+        tag_rows = Project.tags.through.objects.values_list('project_id', 'tag_id')
+        for project_id, tag_id in tag_rows.iterator(chunk_size=10000):
+            tags[tag_id].add(project_id)
+
+        tag_slugs = dict(Tag.objects.values_list('slug', 'id'))
+
+        with self.lock:
+            self.all, self.values, self.tags, self.tag_slugs = all_ids, values, tags, tag_slugs
+            self.version = version
+
+    # Incremental maintenance, called from signals
+
+    def index_project(self, project_id, values):
+        """(Re)index the scalar facets of one project; `values` maps facet -> value"""
+        with self.lock:
+            self.all.add(project_id)
+            for facet, value in values.items():
+                for bitmap in self.values[facet].values():
+                    bitmap.discard(project_id)
+                self.values[facet][value].add(project_id)
+
+    def remove_project(self, project_id):
+        with self.lock:
+            self.all.discard(project_id)
+            for facet_values in self.values.values():
+                for bitmap in facet_values.values():
+                    bitmap.discard(project_id)
+            for bitmap in self.tags.values():
+                bitmap.discard(project_id)
+
+    def add_tags(self, project_ids, tag_ids):
+        with self.lock:
+            for tag_id in tag_ids:
+                for project_id in project_ids:
+                    self.tags[tag_id].add(project_id)
+
+    def remove_tags(self, project_ids, tag_ids=None):
+        """Untag projects; with no tag ids, remove them from every tag"""
+        with self.lock:
+            for tag_id in (self.tags if tag_ids is None else tag_ids):
+                for project_id in project_ids:
+                    self.tags[tag_id].discard(project_id)
+
+    def clear_tag(self, tag_id):
+        with self.lock:
+            self.tags.pop(tag_id, None)
+
+    def set_tag_slug(self, tag_id, slug):
+        with self.lock:
+            self.tag_slugs = {s: t for s, t in self.tag_slugs.items() if t != tag_id}
+            self.tag_slugs[slug] = tag_id
+
+    # Queries
+
+    def _facet_bitmap(self, facet, selected):
+        """OR of the bitmaps for the selected values of one facet"""
+        result = Bitmap()
+        if facet == 'tags':
+            for slug in selected:
+                tag_id = self.tag_slugs.get(slug)
+                if tag_id is not None:
+                    result = result | self.tags.get(tag_id, Bitmap())
+        else:
+            for value in selected:
+                result = result | self.values[facet].get(value, Bitmap())
+        return result
+
+    def match(self, filters, exclude=None):
+        """AND across facets of OR within each facet; `filters` maps facet -> values"""
+        with self.lock:
+            result = Bitmap(dict(self.all.chunks))
+            for facet, selected in filters.items():
+                if selected and facet != exclude:
+                    result = result & self._facet_bitmap(facet, selected)
+            return result
+
+    def counts(self, filters):
+        """
+        Result count for every facet value given the other active filters.
+
+        Each facet is counted against the filters of the *other* facets, so
+        ticking a second stage shows how many results it would add.
+        """
+        with self.lock:
+            tag_ids = {tag_id: slug for slug, tag_id in self.tag_slugs.items()}
+            result = {}
+            for facet in FACETS:
+                base = self.match(filters, exclude=facet)
+                if facet == 'tags':
+                    result[facet] = {
+                        tag_ids[tag_id]: len(base & bitmap)
+                        for tag_id, bitmap in self.tags.items() if tag_id in tag_ids
+                    }
+                else:
+                    result[facet] = {
+                        value: len(base & bitmap)
+                        for value, bitmap in self.values[facet].items()
+                    }
+            return result
+
+
+def project_facet_values(project):
+    """Scalar facet values of a project instance"""
+    return {
+        'stage': project.stage,
+        'status': project.status,
+        'project_type': project.project_type,
+        'collaboration_needed': project.collaboration_needed,
+        'user_type': project.creator_user_type,
+    }
+
+
+# Columns whose change moves a project between facet bitmaps
+PROJECT_FACET_FIELDS = frozenset({'stage', 'status', 'project_type', 'collaboration_needed', 'creator_user_type'})
+
+_index = FacetIndex()
+_rebuilding = threading.Lock()
+# When this process first saw a version its index wasn't built from
+_stale_since = None
+
+
+def _rebuild(version):
+    try:
+        _index.build(version)
+    finally:
+        # The thread's own connection would otherwise stay open for good
+        connection.close()
+        _rebuilding.release()
+
+
+def get_facet_index():
+    """The process-wide index, built on first use and refreshed in the background"""
+    global _stale_since
+    # Read before loading rows, so a change committed mid-build triggers another
+    version = project_version()
+    if _index.version is None:
+        with _rebuilding:
+            if _index.version is None:
+                _index.build(version)
+    elif version == _index.version:
+        _stale_since = None
+    elif _stale_since is None:
+        # This process's own changes are already patched in; others' can wait a little
+        _stale_since = time.monotonic()
+    elif (time.monotonic() - _stale_since > getattr(settings, 'FACET_INDEX_REBUILD_DELAY', 60)
+          and _rebuilding.acquire(blocking=False)):
+        _stale_since = None
+        threading.Thread(target=_rebuild, args=(version,), daemon=True).start()
+    return _index
+
+
+def loaded_facet_index():
+    """The index if this process has built it, for signal handlers to update"""
+    return _index if _index.version is not None else None
+
+
+def facet_page(filters, cursor=None, per_page=12):
+    """
+    Newest-first page of matching projects, paginated like KeysetPaginator.
+
+    Ids are allocated in creation order, so walking the bitmap from the
+    highest id down yields the same order as ('-created_at', '-pk').
+    """
+    ordering = ['-created_at', '-pk']
+    matched = get_facet_index().match(filters)
+
+    values, reverse = None, False
+    if cursor:
+        try:
+            values, reverse = decode_cursor(cursor)
+        except InvalidCursor:
+            values = None
+        # The bitmap walk needs an id; anything else is treated like a bad cursor
+        if values is not None and (len(values) != len(ordering) or not isinstance(values[-1], int)):
+            values, reverse = None, False
+
+    if reverse:
+        ids = _take(matched.iter_asc(after=values[-1]), per_page + 1)
+    else:
+        ids = _take(matched.iter_desc(before=values[-1] if values else None), per_page + 1)
+    has_more = len(ids) > per_page
+    ids = sorted(ids[:per_page], reverse=True)
+
+    by_id = Project.objects.in_bulk(ids)
+    rows = [by_id[id_] for id_ in ids if id_ in by_id]
+
+    if reverse:
+        previous_cursor = cursor_for(rows[0], ordering, reverse=True) if rows and has_more else None
+        next_cursor = cursor_for(rows[-1], ordering) if rows else None
+    else:
+        next_cursor = cursor_for(rows[-1], ordering) if rows and has_more else None
+        previous_cursor = cursor_for(rows[0], ordering, reverse=True) if rows and values else None
+
+    page = KeysetPage(rows, next_cursor, previous_cursor)
+    page.total = len(matched)
+    return page
+
+
+def _take(iterator, count):
+    ids = []
+    for id_ in iterator:
+        ids.append(id_)
+        if len(ids) == count:
+            break
+    return ids
@@ -0,0 +1,114 @@
+import django_filters
+from django.db.models import Count
+
+from .models import *
+
+# Supported listing sorts; each ordering (plus the id tie-breaker) has a matching index
+PROJECT_SORTS = {
+    'newest': ('-created_at',),
+    'oldest': ('created_at',),
+    'popular': ('-views_count',),
+    'title': ('title',),
+    'featured': ('-is_featured', '-created_at'),
+    'trending': ('-trending_score',),
+    'supported': ('-supporters_count',),
+}
+DEFAULT_SORT = 'newest'
+
+# Raw order_by values the explore page used to accept
+SORT_ALIASES = {
+    '-created_at': 'newest',
+    'created_at': 'oldest',
+    '-views_count': 'popular',
+}
+
+
+def resolve_sort(value):
+    """Sort key for a requested value, or '' when it isn't supported"""
+    value = SORT_ALIASES.get(value, value)
+    return value if value in PROJECT_SORTS else ''
+
+
+class ProjectFilter(django_filters.FilterSet):
+    """Project filters, accepting the same parameters as the explore page"""
+    tags = django_filters.ModelMultipleChoiceFilter(
+        field_name='tags__slug',
+        to_field_name='slug',
+        queryset=Tag.objects.all(),
+    )
+    stage = django_filters.MultipleChoiceFilter(choices=Project.PROJECT_STAGES)
+    status = django_filters.MultipleChoiceFilter(choices=Project.PROJECT_STATUS)
+    project_type = django_filters.MultipleChoiceFilter(choices=Project.PROJECT_TYPES)
+    collaboration = django_filters.MultipleChoiceFilter(
+        field_name='collaboration_needed',
+        choices=Project.COLLABORATION_TYPES,
+    )
+    user_type = django_filters.MultipleChoiceFilter(
+        field_name='creator_user_type',
+        choices=User.USER_TYPES,
+    )
+    # Old parameter name, kept for existing clients
+    creator__user_type = django_filters.ChoiceFilter(
+        field_name='creator_user_type',
+        choices=User.USER_TYPES,
+    )
+    sort = django_filters.CharFilter(method='filter_sort')
+
+    class Meta:
+        model = Project
+        fields = []
+
+    def filter_sort(self, queryset, name, value):
+        sort = resolve_sort(value)
+        if not sort:
+            return queryset
+        return queryset.order_by(*PROJECT_SORTS[sort])
+
+
+class UserFilter(django_filters.FilterSet):
+    """People directory filters; several values of one filter are ORed together"""
+    user_type = django_filters.MultipleChoiceFilter(choices=User.USER_TYPES)
+    skills = django_filters.ModelMultipleChoiceFilter(queryset=Skill.objects.all())
+    interests = django_filters.ModelMultipleChoiceFilter(
+        field_name='interests__slug',
+        to_field_name='slug',
+        queryset=Tag.objects.all(),
+    )
+    location = django_filters.CharFilter(lookup_expr='icontains')
+
+    class Meta:
+        model = User
+        fields = []
+
+
+# Number of skills returned in the people facet counts
+USER_SKILL_FACET_LIMIT = 30
+
+
+def _users_filtered_without(params, name, queryset):
+    params = params.copy()
+    params.pop(name, None)
+    return UserFilter(params, queryset=queryset).qs.values('pk')
+
+
+def user_facet_counts(params, queryset):
+    """
+    Result counts per skill and per user type for the people directory.
+
+    Each facet is counted against the *other* active filters, so selecting a
+    skill still shows how many people every other skill would add.
+    """
+    skill_users = _users_filtered_without(params, 'skills', queryset)
+    skills = Skill.objects.filter(
+        users__in=skill_users
+    ).values('id', 'name').annotate(count=Count('users')).order_by('-count', 'name')
+
+    type_users = _users_filtered_without(params, 'user_type', queryset)
+    user_types = User.objects.filter(
+        pk__in=type_users
+    ).order_by().values_list('user_type').annotate(count=Count('pk'))
+
+    return {
+        'skills': list(skills[:USER_SKILL_FACET_LIMIT]),
+        'user_type': dict(user_types),
+    }
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from workstation.buffers import flush_all
+
+
+class Command(BaseCommand):
+    help = 'Writes buffered counter increments (e.g. project views) to the database'
+
+    def handle(self, *args, **kwargs):
+        for key, rows in flush_all().items():
+            self.stdout.write(f'{key}: {rows} rows updated')
+        self.stdout.write(self.style.SUCCESS('Counter buffers flushed'))
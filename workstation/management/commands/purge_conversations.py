@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from workstation.conversations import PURGE_BATCH_SIZE, purge_deleted_messages
+
+
+class Command(BaseCommand):
+    help = 'Removes messages that every participant of their conversation has deleted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=PURGE_BATCH_SIZE, help='Messages removed per transaction')
+        parser.add_argument('--max-batches', type=int, default=None, help='Stop after this many batches')
+
+    def handle(self, *args, **options):
+        removed = purge_deleted_messages(batch_size=options['batch_size'], max_batches=options['max_batches'])
+        self.stdout.write(self.style.SUCCESS(f'Purged {removed} deleted messages'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from workstation.counters import recompute_profile_completeness
+
+
+class Command(BaseCommand):
+    help = 'Rescores profile completeness for every user, e.g. after the weights change'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Users rescored per UPDATE')
+        parser.add_argument('--dry-run', action='store_true', help='Only report users with a stale score')
+
+    def handle(self, *args, **options):
+        changed = recompute_profile_completeness(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        verb = 'Found' if options['dry_run'] else 'Rescored'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {changed} users with a stale profile completeness'))
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from workstation.trending import recompute_project_trending
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the trending score of every project; run periodically, e.g. from cron'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50000, help='Projects written per UPDATE')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = recompute_project_trending(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Rescored {count} projects in {elapsed:.1f}s'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from workstation.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Finds and repairs drift in the denormalized counters and unread badges'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows checked per UPDATE')
+        parser.add_argument('--dry-run', action='store_true', help='Only report drifted rows')
+
+    def handle(self, *args, **options):
+        drift = reconcile_counters(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        for label, rows in drift.items():
+            self.stdout.write(f'{label}: {rows} rows out of sync')
+        verb = 'Found' if options['dry_run'] else 'Repaired'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {sum(drift.values())} drifted counters'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from workstation.trending import rebuild_tag_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds tag usage counts and trending scores from existing projects and thoughts'
+
+    def handle(self, *args, **kwargs):
+        used = rebuild_tag_stats()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt tag stats ({used} tags in use)'))
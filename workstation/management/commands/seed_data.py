@@ -76,7 +76,6 @@ class Command(BaseCommand):
                         'Marketing Manager',
                         'Founder & CEO'
                     ]),
-                    profile_completeness=random.randint(60, 100)
                 )
                 user.skills.add(*random.sample(skills, k=random.randint(2, 5)))
                 user.interests.add(*random.sample(tags, k=random.randint(3, 6)))
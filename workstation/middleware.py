@@ -1,19 +1,14 @@
 from django.utils.deprecation import MiddlewareMixin
-from django.utils import timezone
-from django.contrib.auth import get_user_model
 
-User = get_user_model()
+from .buffers import record_last_seen
 
 
 class UserActivityMiddleware(MiddlewareMixin):
-    """Track user last activity"""
+    """Track user last activity in User.last_seen, through the write-behind buffer"""
 
     def process_request(self, request):
         if request.user.is_authenticated:
-            # Update last activity timestamp
-            User.objects.filter(pk=request.user.pk).update(
-                last_login=timezone.now()
-            )
+            record_last_seen(request.user)
         return None
 
 
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.25 on 2026-10-18 02:33
+
+from django.contrib.postgres.aggregates import StringAgg
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_search_vectors(apps, schema_editor):
+    Project = apps.get_model("workstation", "Project")
+    Tag = apps.get_model("workstation", "Tag")
+
+    tag_names = (
+        Tag.objects.filter(projects=OuterRef("pk"))
+        .order_by()
+        .values("projects")
+        .annotate(names=StringAgg("name", delimiter=" "))
+        .values("names")
+    )
+    vector = (
+        SearchVector("title", weight="A", config="english")
+        + SearchVector("short_description", weight="B", config="english")
+        + SearchVector(Subquery(tag_names), weight="B", config="english")
+        + SearchVector("description", weight="C", config="english")
+    )
+
+    ids = list(Project.objects.order_by("pk").values_list("pk", flat=True))
+    for start in range(0, len(ids), 5000):
+        Project.objects.filter(pk__in=ids[start : start + 5000]).update(
+            search_vector=vector
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("workstation", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="project",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="project",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="projects_search_gin"
+            ),
+        ),
+        migrations.RunPython(backfill_search_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 4.2.25 on 2026-10-18 02:44
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_creator_user_type(apps, schema_editor):
+    Project = apps.get_model("workstation", "Project")
+    User = apps.get_model("workstation", "User")
+
+    user_type = User.objects.filter(pk=OuterRef("creator_id")).values("user_type")[:1]
+    Project.objects.update(creator_user_type=Subquery(user_type))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("workstation", "0003_trigram_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="project",
+            name="creator_user_type",
+            field=models.CharField(
+                choices=[
+                    ("founder", "Founder"),
+                    ("professional", "Professional"),
+                    ("student", "Student"),
+                    ("enthusiast", "Tech Enthusiast"),
+                ],
+                default="enthusiast",
+                editable=False,
+                max_length=20,
+            ),
+        ),
+        migrations.RunPython(backfill_creator_user_type, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="project",
+            index=models.Index(
+                fields=["status", "stage", "-created_at"],
+                name="projects_status_stage_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="project",
+            index=models.Index(
+                fields=["creator_user_type", "-created_at"],
+                name="projects_user_type_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="project",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="projects_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="project",
+            index=models.Index(
+                fields=["-views_count", "-id"], name="projects_views_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="project",
+            index=models.Index(fields=["title", "id"], name="projects_title_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="project",
+            index=models.Index(
+                fields=["-is_featured", "-created_at", "-id"],
+                name="projects_featured_idx",
+            ),
+        ),
+    ]
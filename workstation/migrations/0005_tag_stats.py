@@ -0,0 +1,96 @@
+# Generated by Django 4.2.25 on 2026-10-18 02:46
+
+import math
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_tag_stats(apps, schema_editor):
+    """Same scoring as workstation.trending, dating each tag use by its content"""
+    Tag = apps.get_model("workstation", "Tag")
+    TagStats = apps.get_model("workstation", "TagStats")
+    Project = apps.get_model("workstation", "Project")
+    Thought = apps.get_model("workstation", "Thought")
+
+    epoch = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    half_life = getattr(settings, "TRENDING_HALF_LIFE_DAYS", 7) * 86400
+    counts = defaultdict(lambda: [0, 0])
+    events = defaultdict(list)
+    sources = [
+        (
+            Project.tags.through.objects.values_list("tag_id", "project__created_at"),
+            0,
+            1.0,
+        ),
+        (
+            Thought.tags.through.objects.values_list("tag_id", "thought__created_at"),
+            1,
+            0.5,
+        ),
+    ]
+    for rows, column, weight in sources:
+        for tag_id, created_at in rows.iterator(chunk_size=10000):
+            counts[tag_id][column] += 1
+            age = (created_at - epoch).total_seconds()
+            events[tag_id].append(math.log(weight) + math.log(2) * age / half_life)
+
+    stats = []
+    for tag_id in Tag.objects.values_list("pk", flat=True):
+        score = None
+        if events[tag_id]:
+            top = max(events[tag_id])
+            score = top + math.log(sum(math.exp(e - top) for e in events[tag_id]))
+        stats.append(
+            TagStats(
+                tag_id=tag_id,
+                projects_count=counts[tag_id][0],
+                thoughts_count=counts[tag_id][1],
+                trending_score=score,
+            )
+        )
+    TagStats.objects.bulk_create(stats, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("workstation", "0004_project_explore_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TagStats",
+            fields=[
+                (
+                    "tag",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="workstation.tag",
+                    ),
+                ),
+                ("projects_count", models.IntegerField(default=0)),
+                ("thoughts_count", models.IntegerField(default=0)),
+                ("trending_score", models.FloatField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "db_table": "tag_stats",
+                "indexes": [
+                    models.Index(
+                        models.OrderBy(
+                            models.F("trending_score"), descending=True, nulls_last=True
+                        ),
+                        name="tag_stats_trending_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_tag_stats, migrations.RunPython.noop),
+    ]
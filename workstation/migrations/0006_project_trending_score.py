@@ -0,0 +1,24 @@
+# Generated by Django 4.2.25 on 2026-10-18 02:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("workstation", "0005_tag_stats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="project",
+            name="trending_score",
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="project",
+            index=models.Index(
+                fields=["-trending_score", "-id"], name="projects_trending_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.25 on 2026-10-18 02:48
+
+from django.contrib.postgres.aggregates import StringAgg
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_search_vectors(apps, schema_editor):
+    User = apps.get_model("workstation", "User")
+    Skill = apps.get_model("workstation", "Skill")
+
+    skill_names = (
+        Skill.objects.filter(users=OuterRef("pk"))
+        .order_by()
+        .values("users")
+        .annotate(names=StringAgg("name", delimiter=" "))
+        .values("names")
+    )
+    vector = (
+        SearchVector("username", weight="A", config="english")
+        + SearchVector("first_name", weight="A", config="english")
+        + SearchVector("last_name", weight="A", config="english")
+        + SearchVector("title", weight="B", config="english")
+        + SearchVector(Subquery(skill_names), weight="B", config="english")
+        + SearchVector("bio", weight="C", config="english")
+    )
+
+    ids = list(User.objects.order_by("pk").values_list("pk", flat=True))
+    for start in range(0, len(ids), 5000):
+        User.objects.filter(pk__in=ids[start : start + 5000]).update(
+            search_vector=vector
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("workstation", "0006_project_trending_score"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(backfill_search_vectors, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="user",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="users_search_gin"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="user",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["location"],
+                name="users_location_trgm",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(fields=["user_type"], name="users_user_type_idx"),
+        ),
+    ]
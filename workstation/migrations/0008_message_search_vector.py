@@ -0,0 +1,52 @@
+# Generated by Django 4.2.25 on 2026-10-18 02:49
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import BtreeGinExtension
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+def backfill_search_vectors(apps, schema_editor):
+    Message = apps.get_model("workstation", "Message")
+
+    vector = SearchVector("subject", weight="A", config="english") + SearchVector(
+        "content", weight="B", config="english"
+    )
+    ids = list(Message.objects.order_by("pk").values_list("pk", flat=True))
+    for start in range(0, len(ids), 5000):
+        Message.objects.filter(pk__in=ids[start : start + 5000]).update(
+            search_vector=vector
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("workstation", "0007_user_search_vector"),
+    ]
+
+    operations = [
+        BtreeGinExtension(),
+        migrations.AddField(
+            model_name="message",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(backfill_search_vectors, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="message",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["sender", "search_vector"], name="messages_sender_search_gin"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["recipient", "search_vector"],
+                name="messages_recipient_search_gin",
+            ),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 4.2.25 on 2026-10-18 02:50
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Project = apps.get_model("workstation", "Project")
+    Thought = apps.get_model("workstation", "Thought")
+    ProjectMembership = apps.get_model("workstation", "ProjectMembership")
+    Comment = apps.get_model("workstation", "Comment")
+    ProjectUpdate = apps.get_model("workstation", "ProjectUpdate")
+
+    def count(related, column):
+        counts = (
+            related.objects.filter(**{column: OuterRef("pk")})
+            .order_by()
+            .values(column)
+            .annotate(n=Count("pk"))
+            .values("n")
+        )
+        return Coalesce(Subquery(counts), 0)
+
+    Project.objects.update(
+        supporters_count=count(Project.supporters.through, "project_id"),
+        members_count=count(ProjectMembership, "project_id"),
+        comments_count=count(Comment, "project_id"),
+        updates_count=count(ProjectUpdate, "project_id"),
+    )
+    Thought.objects.update(likes_count=count(Thought.likes.through, "thought_id"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("workstation", "0008_message_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="project",
+            name="comments_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="project",
+            name="members_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="project",
+            name="supporters_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="project",
+            name="updates_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="thought",
+            name="likes_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="project",
+            index=models.Index(
+                fields=["-supporters_count", "-id"], name="projects_supporters_idx"
+            ),
+        ),
+    ]
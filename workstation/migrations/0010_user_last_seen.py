@@ -0,0 +1,18 @@
+# Generated by Django 4.2.25 on 2026-10-18 02:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("workstation", "0009_relationship_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="last_seen",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.25 on 2026-10-18 02:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("workstation", "0010_user_last_seen"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProjectSlugHistory",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("slug", models.SlugField(max_length=300, unique=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="slug_history",
+                        to="workstation.project",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "project_slug_history",
+            },
+        ),
+    ]
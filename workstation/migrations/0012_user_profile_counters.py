@@ -0,0 +1,45 @@
+# Generated by Django 4.2.25 on 2026-10-18 03:00
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    User = apps.get_model("workstation", "User")
+
+    def count(related):
+        counts = (
+            related.objects.filter(user_id=OuterRef("pk"))
+            .order_by()
+            .values("user_id")
+            .annotate(n=Count("pk"))
+            .values("n")
+        )
+        return Coalesce(Subquery(counts), 0)
+
+    User.objects.update(
+        skills_count=count(User.skills.through),
+        interests_count=count(User.interests.through),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("workstation", "0011_project_slug_history"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="interests_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="skills_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
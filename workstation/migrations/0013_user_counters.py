@@ -0,0 +1,65 @@
+# Generated by Django 4.2.25 on 2026-10-18 03:02
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def backfill_counters(apps, schema_editor):
+    User = apps.get_model("workstation", "User")
+    UserCounters = apps.get_model("workstation", "UserCounters")
+    Message = apps.get_model("workstation", "Message")
+    Notification = apps.get_model("workstation", "Notification")
+
+    def unread(related, column):
+        counts = (
+            related.objects.filter(**{column: OuterRef("pk")}, is_read=False)
+            .order_by()
+            .values(column)
+            .annotate(n=Count("pk"))
+            .values("n")
+        )
+        return Coalesce(Subquery(counts), 0)
+
+    UserCounters.objects.bulk_create(
+        [UserCounters(user_id=pk) for pk in User.objects.values_list("pk", flat=True).iterator()],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    UserCounters.objects.update(
+        unread_messages=unread(Message, "recipient_id"),
+        unread_notifications=unread(Notification, "user_id"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("workstation", "0012_user_profile_counters"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserCounters",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="counters",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("unread_messages", models.IntegerField(default=0)),
+                ("unread_notifications", models.IntegerField(default=0)),
+            ],
+            options={
+                "db_table": "user_counters",
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.25 on 2026-10-18 03:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("workstation", "0013_user_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="usercounters",
+            name="notifications_read_through",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["user", "-created_at", "-id"],
+                name="notifications_user_created_idx",
+            ),
+        ),
+    ]
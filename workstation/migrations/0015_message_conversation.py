@@ -0,0 +1,114 @@
+# Generated by Django 4.2.25 on 2026-10-18 03:06
+
+from django.db import migrations, models, transaction
+import django.db.models.deletion
+
+BACKFILL_BATCH_SIZE = 10000
+
+# Messages were only ever sent between two users; give each one the direct
+# two-person conversation of its pair. The pair map is built once into a
+# temporary table, then joined by each batch.
+PAIRS_SQL = """
+    CREATE TEMPORARY TABLE conversation_pairs AS
+    SELECT DISTINCT ON (low, high) id, low, high
+    FROM (
+        SELECT c.id, MIN(p.user_id) AS low, MAX(p.user_id) AS high
+        FROM conversations c
+        JOIN conversations_participants p ON p.conversation_id = c.id
+        WHERE c.project_id IS NULL
+        GROUP BY c.id
+        HAVING COUNT(*) = 2
+    ) AS two
+    ORDER BY low, high, id
+"""
+
+# Pairs that exchanged messages but never got a conversation, each given the
+# id of the one created for it. Messages to oneself have no pair and are left.
+MISSING_PAIRS_SQL = """
+    CREATE TEMPORARY TABLE missing_pairs AS
+    SELECT nextval(pg_get_serial_sequence('conversations', 'id')) AS id, pairs.*
+    FROM (
+        SELECT LEAST(sender_id, recipient_id) AS low, GREATEST(sender_id, recipient_id) AS high,
+            MIN(created_at) AS first_at, MAX(created_at) AS last_at, MAX(id) AS last_message_id
+        FROM messages
+        WHERE conversation_id IS NULL AND sender_id <> recipient_id
+        GROUP BY 1, 2
+    ) AS pairs
+    WHERE NOT EXISTS (
+        SELECT 1 FROM conversation_pairs known WHERE known.low = pairs.low AND known.high = pairs.high
+    )
+"""
+
+CREATE_CONVERSATIONS_SQL = [
+    """
+    INSERT INTO conversations (id, created_at, updated_at, last_message_id)
+    SELECT id, first_at, last_at, last_message_id FROM missing_pairs
+    """,
+    """
+    INSERT INTO conversations_participants (conversation_id, user_id)
+    SELECT id, low FROM missing_pairs UNION ALL SELECT id, high FROM missing_pairs
+    """,
+    "INSERT INTO conversation_pairs (id, low, high) SELECT id, low, high FROM missing_pairs",
+    "DROP TABLE missing_pairs",
+]
+
+BACKFILL_SQL = """
+    UPDATE messages SET conversation_id = pairs.id
+    FROM conversation_pairs pairs
+    WHERE messages.id >= %s AND messages.id < %s
+        AND messages.conversation_id IS NULL
+        AND LEAST(messages.sender_id, messages.recipient_id) = pairs.low
+        AND GREATEST(messages.sender_id, messages.recipient_id) = pairs.high
+"""
+
+
+def backfill_conversations(apps, schema_editor):
+    Message = apps.get_model("workstation", "Message")
+    bounds = Message.objects.aggregate(low=models.Min("pk"), high=models.Max("pk"))
+    if bounds["low"] is None:
+        return
+    schema_editor.execute(PAIRS_SQL)
+    try:
+        # One transaction, so no conversation is left without its participants
+        with transaction.atomic():
+            schema_editor.execute(MISSING_PAIRS_SQL)
+            for sql in CREATE_CONVERSATIONS_SQL:
+                schema_editor.execute(sql)
+        schema_editor.execute("CREATE UNIQUE INDEX ON conversation_pairs (low, high)")
+        schema_editor.execute("ANALYZE conversation_pairs")
+        # The migration isn't atomic, so each batch commits on its own
+        for start in range(bounds["low"], bounds["high"] + 1, BACKFILL_BATCH_SIZE):
+            schema_editor.execute(BACKFILL_SQL, [start, start + BACKFILL_BATCH_SIZE])
+    finally:
+        schema_editor.execute("DROP TABLE conversation_pairs")
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("workstation", "0014_notification_read_watermark"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="conversation",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="messages",
+                to="workstation.conversation",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["conversation", "created_at", "id"],
+                name="messages_conversation_idx",
+            ),
+        ),
+        migrations.RunPython(backfill_conversations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 4.2.25 on 2026-10-18 03:07
+
+from itertools import groupby
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+import django.db.models.deletion
+
+
+def backfill_user_pairs(apps, schema_editor):
+    Conversation = apps.get_model("workstation", "Conversation")
+    Message = apps.get_model("workstation", "Message")
+    Participant = Conversation.participants.through
+
+    pairs = (
+        Participant.objects.filter(conversation__project__isnull=True)
+        .values("conversation_id")
+        .annotate(n=Count("pk"), low=Min("user_id"), high=Max("user_id"))
+        .filter(n=2)
+        .order_by("low", "high", "conversation_id")
+        .values_list("conversation_id", "low", "high")
+    )
+    keyed = []
+    for (low, high), rows in groupby(pairs.iterator(), key=lambda row: row[1:]):
+        keep, *duplicates = [row[0] for row in rows]
+        if duplicates:
+            # Fold racing duplicates into the oldest conversation of the pair
+            Message.objects.filter(conversation_id__in=duplicates).update(conversation_id=keep)
+            updated_at = Conversation.objects.filter(pk__in=[keep, *duplicates]).aggregate(
+                latest=Max("updated_at")
+            )["latest"]
+            last_message = Message.objects.filter(conversation_id=keep).order_by("-created_at", "-id").first()
+            Conversation.objects.filter(pk=keep).update(last_message=last_message, updated_at=updated_at)
+            Conversation.objects.filter(pk__in=duplicates).delete()
+        keyed.append(Conversation(pk=keep, user_low_id=low, user_high_id=high))
+    Conversation.objects.bulk_update(keyed, ["user_low", "user_high"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    # The backfill commits before the constraints are added; Postgres won't
+    # build an index on a table with pending deferred FK checks
+    atomic = False
+
+    dependencies = [
+        ("workstation", "0015_message_conversation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversation",
+            name="user_high",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddField(
+            model_name="conversation",
+            name="user_low",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.RunPython(backfill_user_pairs, migrations.RunPython.noop, atomic=True),
+        migrations.AddConstraint(
+            model_name="conversation",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("user_low__isnull", False)),
+                fields=("user_low", "user_high"),
+                name="conversations_user_pair_uniq",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="conversation",
+            constraint=models.CheckConstraint(
+                check=models.Q(("user_low__lt", models.F("user_high"))),
+                name="conversations_user_pair_ordered",
+            ),
+        ),
+    ]
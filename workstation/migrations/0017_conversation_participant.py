@@ -0,0 +1,104 @@
+# Generated by Django 4.2.25 on 2026-10-18 03:09
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def backfill_read_state(apps, schema_editor):
+    ConversationParticipant = apps.get_model("workstation", "ConversationParticipant")
+    Message = apps.get_model("workstation", "Message")
+
+    def messages(**filters):
+        return Message.objects.filter(conversation_id=OuterRef("conversation_id"), **filters).order_by()
+
+    unread = messages(recipient_id=OuterRef("user_id"), is_read=False)
+    unread_count = unread.values("conversation_id").annotate(n=Count("pk")).values("n")
+    first_unread = unread.values("conversation_id").annotate(first=Min("pk")).values("first")
+    last_message = messages().values("conversation_id").annotate(last=Max("pk")).values("last")
+    # Everything before the first unread message counts as read
+    ConversationParticipant.objects.update(
+        unread_count=Coalesce(Subquery(unread_count), 0),
+        last_read_message_id=Coalesce(Subquery(first_unread) - 1, Subquery(last_message), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("workstation", "0016_conversation_user_pair"),
+    ]
+
+    operations = [
+        # Take over the table of the auto-created participants through model
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name="ConversationParticipant",
+                    fields=[
+                        (
+                            "id",
+                            models.BigAutoField(
+                                auto_created=True,
+                                primary_key=True,
+                                serialize=False,
+                                verbose_name="ID",
+                            ),
+                        ),
+                        (
+                            "conversation",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                related_name="memberships",
+                                to="workstation.conversation",
+                            ),
+                        ),
+                        (
+                            "user",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                related_name="conversation_memberships",
+                                to=settings.AUTH_USER_MODEL,
+                            ),
+                        ),
+                    ],
+                    options={
+                        "db_table": "conversations_participants",
+                        "unique_together": {("conversation", "user")},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name="conversation",
+                    name="participants",
+                    field=models.ManyToManyField(
+                        related_name="conversations",
+                        through="workstation.ConversationParticipant",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="conversationparticipant",
+            name="last_read_message_id",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="conversationparticipant",
+            name="unread_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="conversationparticipant",
+            name="muted",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="conversationparticipant",
+            name="archived",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(backfill_read_state, migrations.RunPython.noop),
+    ]
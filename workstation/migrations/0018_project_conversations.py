@@ -0,0 +1,34 @@
+# Generated by Django 4.2.25 on 2026-10-18 03:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("workstation", "0017_conversation_participant"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="message",
+            name="recipient",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="received_messages",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="conversation",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("project__isnull", False)),
+                fields=("project",),
+                name="conversations_project_uniq",
+            ),
+        ),
+    ]
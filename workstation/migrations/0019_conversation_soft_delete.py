@@ -0,0 +1,31 @@
+# Generated by Django 4.2.25 on 2026-10-18 03:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("workstation", "0018_project_conversations"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversationparticipant",
+            name="deleted",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="conversationparticipant",
+            name="deleted_through_message_id",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="conversationparticipant",
+            index=models.Index(
+                condition=models.Q(("deleted_through_message_id__gt", 0)),
+                fields=["conversation"],
+                name="conv_participants_deleted_idx",
+            ),
+        ),
+    ]
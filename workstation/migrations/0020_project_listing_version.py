@@ -0,0 +1,40 @@
+# Generated by Django 4.2.25 on 2026-10-18 03:24
+
+import time
+
+from django.db import migrations, models
+
+
+def create_version_row(apps, schema_editor):
+    ProjectListingVersion = apps.get_model("workstation", "ProjectListingVersion")
+    # Start from the clock so versions used by the old cache counter aren't reused
+    ProjectListingVersion.objects.create(pk=1, version=int(time.time() * 1000))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("workstation", "0019_conversation_soft_delete"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProjectListingVersion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("version", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "db_table": "project_listing_version",
+            },
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
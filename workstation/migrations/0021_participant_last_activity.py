@@ -0,0 +1,46 @@
+# Generated by Django 4.2.25 on 2026-10-18 03:28
+
+from django.db import migrations, models
+import django.utils.timezone
+
+BACKFILL_BATCH_SIZE = 10000
+
+BACKFILL_SQL = """
+    UPDATE conversations_participants AS p SET last_activity_at = c.updated_at
+    FROM conversations c
+    WHERE c.id = p.conversation_id AND p.id >= %s AND p.id < %s
+"""
+
+
+def backfill_last_activity(apps, schema_editor):
+    ConversationParticipant = apps.get_model("workstation", "ConversationParticipant")
+    bounds = ConversationParticipant.objects.aggregate(low=models.Min("pk"), high=models.Max("pk"))
+    if bounds["low"] is None:
+        return
+    # The migration isn't atomic, so each batch commits on its own
+    for start in range(bounds["low"], bounds["high"] + 1, BACKFILL_BATCH_SIZE):
+        schema_editor.execute(BACKFILL_SQL, [start, start + BACKFILL_BATCH_SIZE])
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("workstation", "0020_project_listing_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversationparticipant",
+            name="last_activity_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(backfill_last_activity, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="conversationparticipant",
+            index=models.Index(
+                fields=["user", "archived", "deleted", "-last_activity_at", "-id"],
+                name="conv_participants_inbox_idx",
+            ),
+        ),
+    ]
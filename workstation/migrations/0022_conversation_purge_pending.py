@@ -0,0 +1,35 @@
+# Generated by Django 4.2.25 on 2026-10-18 03:43
+
+from django.db import migrations, models
+
+
+def mark_pending(apps, schema_editor):
+    Conversation = apps.get_model("workstation", "Conversation")
+    ConversationParticipant = apps.get_model("workstation", "ConversationParticipant")
+    # Everything deleted so far is due for the first purge
+    deleted = ConversationParticipant.objects.filter(deleted_through_message_id__gt=0).values("conversation_id")
+    Conversation.objects.filter(pk__in=deleted).update(purge_pending=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("workstation", "0021_participant_last_activity"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversation",
+            name="purge_pending",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_pending, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="conversation",
+            index=models.Index(
+                condition=models.Q(("purge_pending", True)),
+                fields=["id"],
+                name="conversations_purge_idx",
+            ),
+        ),
+    ]
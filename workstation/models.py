@@ -1,10 +1,82 @@
-from django.db import models
+import copy
+
+from django.db import IntegrityError, models, transaction
+from django.db.models.fields.files import FieldFile
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.utils import timezone
 from django.utils.text import slugify
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 
-class User(AbstractUser):
+class TrackedFieldsMixin:
+    """
+    Remembers the column values an instance was loaded (or last saved) with,
+    so changes can be checked without a query and save() only writes the
+    columns that changed. Columns moved in the database behind the instance's
+    back (counters, search vectors) are no longer overwritten with stale values.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_fields()
+        return instance
+
+    def _tracked_value(self, field):
+        value = self.__dict__[field.attname]
+        if isinstance(value, FieldFile):
+            return value.name
+        return copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+
+    def _remember_fields(self, names=None):
+        loaded = self.__dict__.setdefault('_loaded_values', {})
+        for field in self._meta.concrete_fields:
+            if names is not None and field.name not in names and field.attname not in names:
+                continue
+            if field.attname in self.__dict__:
+                loaded[field.attname] = self._tracked_value(field)
+
+    def loaded_value(self, name):
+        """Value the field had when loaded or last saved, None if unknown"""
+        return self.__dict__.get('_loaded_values', {}).get(self._meta.get_field(name).attname)
+
+    def has_changed(self, name):
+        """True if the field differs from its loaded value, or that value is unknown"""
+        field = self._meta.get_field(name)
+        if field.attname not in self.__dict__:
+            # Deferred and never assigned
+            return False
+        loaded = self.__dict__.get('_loaded_values', {})
+        return field.attname not in loaded or self._tracked_value(field) != loaded[field.attname]
+
+    def get_changed_fields(self):
+        """Names of the loaded fields whose values have changed"""
+        loaded = self.__dict__.get('_loaded_values', {})
+        return {
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and field.attname in self.__dict__ and (
+                field.attname not in loaded or self._tracked_value(field) != loaded[field.attname]
+            )
+        }
+
+    def save(self, *args, **kwargs):
+        # Narrow plain saves of loaded rows; auto_now columns are still touched
+        if (not args and kwargs.get('update_fields') is None and not kwargs.get('force_insert')
+                and not self._state.adding and '_loaded_values' in self.__dict__):
+            kwargs['update_fields'] = self.get_changed_fields() | {
+                field.name for field in self._meta.concrete_fields if getattr(field, 'auto_now', False)
+            }
+        super().save(*args, **kwargs)
+        self._remember_fields(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using, fields, **kwargs)
+        self._remember_fields(fields)
+
+
+class User(TrackedFieldsMixin, AbstractUser):
     """Extended user model for Workstation Hub"""
     USER_TYPES = (
         ('founder', 'Founder'),
@@ -24,14 +96,58 @@ class User(AbstractUser):
     github = models.URLField(blank=True)
     skills = models.ManyToManyField('Skill', blank=True, related_name='users')
     interests = models.ManyToManyField('Tag', blank=True, related_name='interested_users')
+    # Denormalized relation counts, maintained by counters.py
+    skills_count = models.IntegerField(default=0, editable=False)
+    interests_count = models.IntegerField(default=0, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Last request by the user, to LAST_SEEN_GRANULARITY; see UserActivityMiddleware
+    last_seen = models.DateTimeField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Profile completeness points, earned when any field of the group is filled
+    COMPLETENESS_WEIGHTS = (
+        (('first_name',), 10),
+        (('last_name',), 10),
+        (('bio',), 15),
+        (('title',), 10),
+        (('profile_image',), 15),
+        (('location',), 10),
+        (('website', 'linkedin', 'github'), 10),
+        (('skills_count',), 10),
+        (('interests_count',), 10),
+    )
+    COMPLETENESS_FIELDS = frozenset(name for names, _ in COMPLETENESS_WEIGHTS for name in names)
+
+    def save(self, *args, **kwargs):
+        # Scored from the values in memory; m2m changes rescore in SQL (counters.py)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or self.COMPLETENESS_FIELDS.intersection(update_fields):
+            self.profile_completeness = self.compute_profile_completeness()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'profile_completeness'}
+        super().save(*args, **kwargs)
+
+    def compute_profile_completeness(self):
+        return sum(
+            weight for names, weight in self.COMPLETENESS_WEIGHTS
+            if any(getattr(self, name) for name in names)
+        )
+
     def __str__(self):
         return self.username
 
     class Meta:
         db_table = 'users'
+        indexes = [
+            GinIndex(fields=['username'], opclasses=['gin_trgm_ops'], name='users_username_trgm'),
+            GinIndex(fields=['first_name'], opclasses=['gin_trgm_ops'], name='users_first_name_trgm'),
+            GinIndex(fields=['last_name'], opclasses=['gin_trgm_ops'], name='users_last_name_trgm'),
+            # People search
+            GinIndex(fields=['search_vector'], name='users_search_gin'),
+            GinIndex(fields=['location'], opclasses=['gin_trgm_ops'], name='users_location_trgm'),
+            models.Index(fields=['user_type'], name='users_user_type_idx'),
+        ]
 
 
 class Tag(models.Model):
@@ -51,6 +167,31 @@ class Tag(models.Model):
     class Meta:
         db_table = 'tags'
         ordering = ['name']
+        indexes = [
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='tags_name_trgm'),
+        ]
+
+
+class TagStats(models.Model):
+    """Usage counts and trending score of a tag, maintained from signals"""
+    tag = models.OneToOneField(Tag, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    projects_count = models.IntegerField(default=0)
+    thoughts_count = models.IntegerField(default=0)
+    # log of the time-decayed activity, see trending.py; NULL until the tag is first used
+    trending_score = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Stats for {self.tag}'
+
+    class Meta:
+        db_table = 'tag_stats'
+        indexes = [
+            models.Index(
+                models.F('trending_score').desc(nulls_last=True),
+                name='tag_stats_trending_idx',
+            ),
+        ]
 
 
 class Skill(models.Model):
@@ -65,9 +206,12 @@ class Skill(models.Model):
     class Meta:
         db_table = 'skills'
         ordering = ['name']
+        indexes = [
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='skills_name_trgm'),
+        ]
 
 
-class Project(models.Model):
+class Project(TrackedFieldsMixin, models.Model):
     """Projects/Ideas/Ventures on the platform"""
     PROJECT_STAGES = (
         ('idea', 'Idea'),
@@ -102,6 +246,8 @@ class Project(models.Model):
     short_description = models.CharField(max_length=500, blank=True)
     project_type = models.CharField(max_length=20, choices=PROJECT_TYPES, default='project')
     creator = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_projects')
+    # Copy of creator.user_type so explore can filter on it without joining users
+    creator_user_type = models.CharField(max_length=20, choices=User.USER_TYPES, default='enthusiast', editable=False)
     stage = models.CharField(max_length=20, choices=PROJECT_STAGES, default='idea')
     status = models.CharField(max_length=20, choices=PROJECT_STATUS, default='open')
     collaboration_needed = models.CharField(max_length=20, choices=COLLABORATION_TYPES, blank=True)
@@ -110,16 +256,77 @@ class Project(models.Model):
     members = models.ManyToManyField(User, through='ProjectMembership', related_name='joined_projects')
     supporters = models.ManyToManyField(User, blank=True, related_name='supported_projects')
     views_count = models.IntegerField(default=0)
+    # Denormalized relation counts, maintained by counters.py
+    supporters_count = models.IntegerField(default=0, editable=False)
+    members_count = models.IntegerField(default=0, editable=False)
+    comments_count = models.IntegerField(default=0, editable=False)
+    updates_count = models.IntegerField(default=0, editable=False)
     is_featured = models.BooleanField(default=False)
+    # Hotness from the last recompute_trending run
+    trending_score = models.FloatField(default=0, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Attempts at saving with a freshly allocated slug when another save took it first
+    SLUG_RETRIES = 5
+
     def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = slugify(self.title)
+        update_fields = kwargs.get('update_fields')
+        allocated = False
+        if not self.slug or (not self._state.adding and self.has_changed('title')):
+            self.slug = self.allocate_slug()
+            allocated = True
+            if update_fields is not None and 'title' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'slug'}
         if not self.short_description and self.description:
             self.short_description = self.description[:200]
-        super().save(*args, **kwargs)
+        if update_fields is None and (self._state.adding or self.has_changed('creator')) and self.creator_id:
+            self.creator_user_type = self.creator.user_type
+
+        if not allocated:
+            return super().save(*args, **kwargs)
+        for attempt in range(self.SLUG_RETRIES):
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                # A concurrent save may have taken the slug; anything else is re-raised
+                if attempt == self.SLUG_RETRIES - 1 or not Project.objects.filter(
+                    slug=self.slug
+                ).exclude(pk=self.pk).exists():
+                    raise
+                self.slug = self.allocate_slug()
+
+    @classmethod
+    def slug_base(cls, title):
+        """Slugified title, leaving room in the column for a numeric suffix"""
+        max_length = cls._meta.get_field('slug').max_length
+        return slugify(title)[:max_length - 11].strip('-') or 'project'
+
+    def allocate_slug(self):
+        """
+        Free slug for the title: the bare slugified title if free, else one
+        past the highest suffix the allocator has handed out, found with a
+        single indexed query. A slug that is some project's own bare title
+        ("app-2024" for "App 2024") is never read as a sequence number.
+        """
+        base = self.slug_base(self.title)
+        # Suffixes are capped at 9 digits, so nothing longer reaches the counter
+        taken = dict(Project.objects.filter(
+            slug__startswith=base, slug__regex=rf'^{base}(-[0-9]{{1,9}})?$'
+        ).exclude(pk=self.pk).values_list('slug', 'title'))
+        if base not in taken:
+            return base
+        suffix = len(base) + 1
+        allocated = [
+            int(slug[suffix:]) for slug, title in taken.items()
+            if slug != base and self.slug_base(title) != slug
+        ]
+        number = max(allocated, default=1) + 1
+        while f"{base}-{number}" in taken:
+            number += 1
+        return f"{base}-{number}"
 
     def __str__(self):
         return self.title
@@ -127,6 +334,43 @@ class Project(models.Model):
     class Meta:
         db_table = 'projects'
         ordering = ['-created_at']
+        indexes = [
+            GinIndex(fields=['search_vector'], name='projects_search_gin'),
+            GinIndex(fields=['title'], opclasses=['gin_trgm_ops'], name='projects_title_trgm'),
+            # Explore filters and the sorts in filters.PROJECT_SORTS
+            models.Index(fields=['status', 'stage', '-created_at'], name='projects_status_stage_idx'),
+            models.Index(fields=['creator_user_type', '-created_at'], name='projects_user_type_idx'),
+            models.Index(fields=['-created_at', '-id'], name='projects_created_idx'),
+            models.Index(fields=['-views_count', '-id'], name='projects_views_idx'),
+            models.Index(fields=['title', 'id'], name='projects_title_idx'),
+            models.Index(fields=['-is_featured', '-created_at', '-id'], name='projects_featured_idx'),
+            models.Index(fields=['-trending_score', '-id'], name='projects_trending_idx'),
+            models.Index(fields=['-supporters_count', '-id'], name='projects_supporters_idx'),
+        ]
+
+
+class ProjectSlugHistory(models.Model):
+    """Former slug of a project, redirected to its current one"""
+    slug = models.SlugField(max_length=300, unique=True)
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='slug_history')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.slug} -> {self.project_id}"
+
+    class Meta:
+        db_table = 'project_slug_history'
+
+
+class ProjectListingVersion(models.Model):
+    """Single row whose version keys the cached project listings"""
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"v{self.version}"
+
+    class Meta:
+        db_table = 'project_listing_version'
 
 
 class ProjectMembership(models.Model):
@@ -157,6 +401,7 @@ class Thought(models.Model):
     content = models.TextField(max_length=1000)
     tags = models.ManyToManyField(Tag, blank=True, related_name='thoughts')
     likes = models.ManyToManyField(User, blank=True, related_name='liked_thoughts')
+    likes_count = models.IntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -171,37 +416,123 @@ class Thought(models.Model):
 class Message(models.Model):
     """Messages between users"""
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_messages')
-    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='received_messages')
+    # NULL for messages to a project's team conversation, stored once for every participant
+    recipient = models.ForeignKey(
+        User, on_delete=models.CASCADE, null=True, blank=True, related_name='received_messages'
+    )
+    # Indexed by messages_conversation_idx
+    conversation = models.ForeignKey(
+        'Conversation', on_delete=models.CASCADE, null=True, blank=True, related_name='messages', db_index=False
+    )
     subject = models.CharField(max_length=300, blank=True)
     content = models.TextField()
     is_read = models.BooleanField(default=False)
     parent_message = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     read_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
+        if self.recipient_id is None:
+            return f"{self.sender.username} to conversation {self.conversation_id}"
         return f"{self.sender.username} to {self.recipient.username}"
 
     class Meta:
         db_table = 'messages'
         ordering = ['-created_at']
+        indexes = [
+            # Search is always scoped to one participant; btree_gin lets each
+            # side be answered by a single index scan
+            GinIndex(fields=['sender', 'search_vector'], name='messages_sender_search_gin'),
+            GinIndex(fields=['recipient', 'search_vector'], name='messages_recipient_search_gin'),
+            # A thread page is one range scan, read backwards for the newest messages
+            models.Index(fields=['conversation', 'created_at', 'id'], name='messages_conversation_idx'),
+        ]
 
 
 class Conversation(models.Model):
     """Conversation threads between users"""
     def get_other_user(self, current_user):
         """Get the other participant in the conversation"""
+        if self.user_low_id is not None:
+            # One-to-one conversations name both users in their key
+            return self.user_high if self.user_low_id == current_user.pk else self.user_low
+        if self.project_id is not None:
+            # A team conversation has no single other participant
+            return None
         return self.participants.exclude(id=current_user.id).first()
 
-    participants = models.ManyToManyField(User, related_name='conversations')
+    participants = models.ManyToManyField(User, through='ConversationParticipant', related_name='conversations')
     project = models.ForeignKey(Project, on_delete=models.CASCADE, null=True, blank=True, related_name='conversations')
+    # Canonical key of a one-to-one conversation, lower user id first; NULL for project conversations
+    user_low = models.ForeignKey(
+        User, on_delete=models.CASCADE, null=True, blank=True, related_name='+', db_index=False
+    )
+    user_high = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
     last_message = models.ForeignKey(Message, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # Set when a participant deletes or leaves, until purge_deleted_messages() has looked at it
+    purge_pending = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = 'conversations'
         ordering = ['-updated_at']
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(purge_pending=True), name='conversations_purge_idx'),
+        ]
+        constraints = [
+            # One conversation per pair of users; also the index the pair is looked up by
+            models.UniqueConstraint(
+                fields=['user_low', 'user_high'],
+                condition=models.Q(user_low__isnull=False),
+                name='conversations_user_pair_uniq',
+            ),
+            models.CheckConstraint(
+                check=models.Q(user_low__lt=models.F('user_high')),
+                name='conversations_user_pair_ordered',
+            ),
+            # One team conversation per project
+            models.UniqueConstraint(
+                fields=['project'],
+                condition=models.Q(project__isnull=False),
+                name='conversations_project_uniq',
+            ),
+        ]
+
+
+class ConversationParticipant(models.Model):
+    """A user's place in a conversation, with their own read state"""
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='memberships')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversation_memberships')
+    # Read watermark: messages up to this id are read. A plain id, so deleting messages never moves it
+    last_read_message_id = models.BigIntegerField(default=0)
+    # Messages to the user above the watermark, maintained by counters.py
+    unread_count = models.IntegerField(default=0)
+    muted = models.BooleanField(default=False)
+    archived = models.BooleanField(default=False)
+    # Deleted for this user: hidden from the inbox until a new message, history up to the id gone for good
+    deleted = models.BooleanField(default=False)
+    deleted_through_message_id = models.BigIntegerField(default=0)
+    # The conversation's latest activity, copied here so the inbox is one index scan
+    last_activity_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'conversations_participants'
+        unique_together = ['conversation', 'user']
+        indexes = [
+            # The inbox: a user's rows, most recently active first
+            models.Index(
+                fields=['user', 'archived', 'deleted', '-last_activity_at', '-id'],
+                name='conv_participants_inbox_idx',
+            ),
+            # Conversations the purger has to look at
+            models.Index(
+                fields=['conversation'],
+                condition=models.Q(deleted_through_message_id__gt=0),
+                name='conv_participants_deleted_idx',
+            ),
+        ]
 
 
 class Notification(models.Model):
@@ -226,6 +557,25 @@ class Notification(models.Model):
     class Meta:
         db_table = 'notifications'
         ordering = ['-created_at']
+        indexes = [
+            # Notification center pages and the latest id for the read watermark
+            models.Index(fields=['user', '-created_at', '-id'], name='notifications_user_created_idx'),
+        ]
+
+
+class UserCounters(models.Model):
+    """Per-user unread counts behind the badges, maintained by counters.py"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='counters')
+    unread_messages = models.IntegerField(default=0)
+    unread_notifications = models.IntegerField(default=0)
+    # Notifications up to this id are read, whatever their is_read flag says
+    notifications_read_through = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.unread_messages} messages, {self.unread_notifications} notifications"
+
+    class Meta:
+        db_table = 'user_counters'
 
 
 class ProjectUpdate(models.Model):
@@ -0,0 +1,237 @@
+"""
+Keyset (cursor) pagination shared by the HTML views and the API.
+
+Pages are addressed by an opaque cursor holding the sort column values of
+the last row seen plus its id, so every page is a single indexed range scan:
+no COUNT(*) and no OFFSET, and page 500 costs the same as page 1.
+"""
+import base64
+import binascii
+import datetime
+import decimal
+import json
+from functools import reduce
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor cannot be decoded"""
+
+
+def encode_cursor(values, reverse=False):
+    payload = {'v': values}
+    if reverse:
+        payload['r'] = 1
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (values, reverse) for a cursor produced by encode_cursor()"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        values = payload['v']
+        reverse = bool(payload.get('r'))
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list):
+        raise InvalidCursor(cursor)
+    return values, reverse
+
+
+def get_keyset_ordering(queryset):
+    """Ordering of the queryset with the primary key appended as a tie-breaker"""
+    ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+    if not all(isinstance(field, str) for field in ordering):
+        raise ValueError('Keyset pagination only supports ordering by field names')
+
+    ordering = [field for field in ordering if field.lstrip('-') not in ('pk', 'id')]
+    descending = ordering[-1].startswith('-') if ordering else True
+    ordering.append('-pk' if descending else 'pk')
+    return ordering
+
+
+def flip_ordering(ordering):
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+
+def keyset_filter(ordering, values):
+    """Rows strictly after `values` in `ordering`: (a > x) OR (a = x AND b > y) ..."""
+    clauses = []
+    for index, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        equal = {ordering[i].lstrip('-'): values[i] for i in range(index)}
+        clauses.append(Q(**equal, **{f'{name}__{lookup}': values[index]}))
+    return reduce(lambda left, right: left | right, clauses)
+
+
+def _cursor_value(obj, field):
+    value = obj
+    for part in field.lstrip('-').split('__'):
+        value = getattr(value, part)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+def cursor_for(obj, ordering, reverse=False):
+    return encode_cursor([_cursor_value(obj, field) for field in ordering], reverse=reverse)
+
+
+class KeysetPage:
+    """One page of results plus the cursors to its neighbours"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+
+class KeysetPaginator:
+    """Cursor-based replacement for django.core.paginator.Paginator"""
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = get_keyset_ordering(queryset)
+
+    def page(self, cursor=None):
+        """Fetch the page after (or, for a reverse cursor, before) `cursor`"""
+        values, reverse = decode_cursor(cursor) if cursor else (None, False)
+        if values is not None and len(values) != len(self.ordering):
+            raise InvalidCursor(cursor)
+
+        ordering = flip_ordering(self.ordering) if reverse else self.ordering
+        queryset = self.queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(keyset_filter(ordering, values))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if reverse:
+            rows.reverse()
+            previous_cursor = cursor_for(rows[0], self.ordering, reverse=True) if has_more else None
+            next_cursor = cursor_for(rows[-1], self.ordering) if rows else None
+        else:
+            next_cursor = cursor_for(rows[-1], self.ordering) if has_more else None
+            previous_cursor = cursor_for(rows[0], self.ordering, reverse=True) if rows and values else None
+
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+    def get_page(self, cursor=None):
+        """Like page(), but falls back to the first page for a bad cursor"""
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
+
+
+class KeysetPagination(BasePagination):
+    """
+    DRF pagination following opaque `next`/`previous` cursors.
+
+    Requests that still send `?page=N` get the old page-number behaviour
+    (including `count`), so existing clients keep working.
+    """
+    page_size = 12
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_query_param = 'page'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def _legacy_paginator(self):
+        paginator = PageNumberPagination()
+        paginator.page_size = self.page_size
+        paginator.page_size_query_param = self.page_size_query_param
+        paginator.max_page_size = self.max_page_size
+        paginator.page_query_param = self.page_query_param
+        return paginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.legacy = None
+        if self.page_query_param in request.query_params:
+            self.legacy = self._legacy_paginator()
+            return self.legacy.paginate_queryset(queryset, request, view)
+
+        paginator = KeysetPaginator(queryset, self.get_page_size(request))
+        try:
+            self.page = paginator.page(request.query_params.get(self.cursor_query_param))
+        except InvalidCursor:
+            raise NotFound('Invalid cursor')
+        return list(self.page)
+
+    def paginate_rows(self, request, rows, next_cursor=None, previous_cursor=None):
+        """Use an already resolved page, e.g. one rebuilt from a cache entry"""
+        self.request = request
+        self.legacy = None
+        self.page = KeysetPage(rows, next_cursor, previous_cursor)
+        return rows
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        return self._link(self.page.next_cursor)
+
+    def get_previous_link(self):
+        return self._link(self.page.previous_cursor)
+
+    def get_paginated_response(self, data):
+        if self.legacy is not None:
+            return self.legacy.get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
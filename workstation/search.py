@@ -0,0 +1,303 @@
+"""
+Search helpers backed by Postgres indexes.
+
+Full-text search vectors are stored on the row and refreshed from signals,
+so queries only have to hit the GIN index instead of scanning with icontains.
+Projects, people (users) and messages each have their own vector.
+Typeahead uses pg_trgm word similarity over trigram GIN indexes.
+"""
+import hashlib
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchHeadline, SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity,
+)
+from django.core.cache import cache
+from django.db.models import F, FloatField, OuterRef, Q, Subquery
+from django.db.models.functions import Cast, Greatest
+from django.urls import reverse
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from rest_framework import filters
+
+from .conversations import member_messages, visible_messages
+from .models import Message, Project, Skill, Tag, User
+
+SEARCH_CONFIG = 'english'
+
+# Columns that feed Project.search_vector; saves touching none of them skip the refresh
+PROJECT_SEARCH_FIELDS = frozenset({'title', 'short_description', 'description'})
+
+# Control characters are used as highlight markers so the snippet can be escaped safely
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_STOP = '\x03'
+
+
+def build_search_query(text):
+    """Parse user input with websearch syntax (quotes, OR, -exclusions)"""
+    return SearchQuery(text, search_type='websearch', config=SEARCH_CONFIG)
+
+
+def project_search_vector():
+    """Weighted vector: title > short description and tags > description"""
+    tag_names = Tag.objects.filter(
+        projects=OuterRef('pk')
+    ).order_by().values('projects').annotate(
+        names=StringAgg('name', delimiter=' ')
+    ).values('names')
+
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG) +
+        SearchVector('short_description', weight='B', config=SEARCH_CONFIG) +
+        SearchVector(Subquery(tag_names), weight='B', config=SEARCH_CONFIG) +
+        SearchVector('description', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def update_project_search_vectors(project_ids):
+    """Recompute the stored search vector for the given projects in one UPDATE"""
+    project_ids = list(project_ids)
+    if not project_ids:
+        return 0
+    return Project.objects.filter(pk__in=project_ids).update(
+        search_vector=project_search_vector()
+    )
+
+
+def search_projects(queryset, text):
+    """Filter projects by full-text match, ordered by rank, with a headline snippet"""
+    query = build_search_query(text)
+    return queryset.filter(search_vector=query).annotate(
+        # ts_rank() is a float4; widen it so the value survives a cursor round trip
+        search_rank=Cast(SearchRank(F('search_vector'), query), FloatField()),
+        search_headline=SearchHeadline(
+            'description',
+            query,
+            config=SEARCH_CONFIG,
+            start_sel=HIGHLIGHT_START,
+            stop_sel=HIGHLIGHT_STOP,
+            max_words=35,
+            min_words=15,
+        ),
+    ).order_by('-search_rank', '-created_at')
+
+
+def render_headline(headline):
+    """Escape a headline and turn its markers into <mark> tags"""
+    if not headline:
+        return None
+    html = escape(headline).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_STOP, '</mark>')
+    return mark_safe(html)
+
+
+class ProjectSearchFilter(filters.SearchFilter):
+    """DRF search backend using the project search index instead of icontains"""
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '').strip()
+        if not text:
+            return queryset
+        return search_projects(queryset, text)
+
+
+# People search
+
+# Columns that feed User.search_vector
+USER_SEARCH_FIELDS = frozenset({'username', 'first_name', 'last_name', 'title', 'bio'})
+
+
+def user_search_vector():
+    """Weighted vector: names > title and skills > bio"""
+    skill_names = Skill.objects.filter(
+        users=OuterRef('pk')
+    ).order_by().values('users').annotate(
+        names=StringAgg('name', delimiter=' ')
+    ).values('names')
+
+    return (
+        SearchVector('username', weight='A', config=SEARCH_CONFIG) +
+        SearchVector('first_name', weight='A', config=SEARCH_CONFIG) +
+        SearchVector('last_name', weight='A', config=SEARCH_CONFIG) +
+        SearchVector('title', weight='B', config=SEARCH_CONFIG) +
+        SearchVector(Subquery(skill_names), weight='B', config=SEARCH_CONFIG) +
+        SearchVector('bio', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def update_user_search_vectors(user_ids):
+    """Recompute the stored search vector for the given users in one UPDATE"""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return 0
+    return User.objects.filter(pk__in=user_ids).update(search_vector=user_search_vector())
+
+
+def search_users(queryset, text):
+    """Filter users by full-text match over names, title, skills and bio, best first"""
+    query = build_search_query(text)
+    return queryset.filter(search_vector=query).annotate(
+        search_rank=Cast(SearchRank(F('search_vector'), query), FloatField()),
+    ).order_by('-search_rank', '-profile_completeness')
+
+
+class UserSearchFilter(filters.SearchFilter):
+    """DRF search backend for the people directory"""
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '').strip()
+        if not text:
+            return queryset
+        return search_users(queryset, text)
+
+
+# Message search
+
+# Columns that feed Message.search_vector
+MESSAGE_SEARCH_FIELDS = frozenset({'subject', 'content'})
+
+
+def message_search_vector():
+    return (
+        SearchVector('subject', weight='A', config=SEARCH_CONFIG) +
+        SearchVector('content', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def update_message_search_vectors(message_ids):
+    message_ids = list(message_ids)
+    if not message_ids:
+        return 0
+    return Message.objects.filter(pk__in=message_ids).update(search_vector=message_search_vector())
+
+
+def search_messages(user, text):
+    """Messages of `user`'s conversations matching `text`, newest first, with a headline"""
+    query = build_search_query(text)
+    messages = member_messages(user).filter(search_vector=query)
+    return visible_messages(messages, user).annotate(
+        search_headline=SearchHeadline(
+            'content',
+            query,
+            config=SEARCH_CONFIG,
+            start_sel=HIGHLIGHT_START,
+            stop_sel=HIGHLIGHT_STOP,
+            max_words=35,
+            min_words=15,
+        ),
+    ).order_by('-created_at')
+
+
+# Typeahead
+TYPEAHEAD_TYPES = ('project', 'user', 'tag', 'skill')
+TYPEAHEAD_MIN_LENGTH = 2
+TYPEAHEAD_MAX_LENGTH = 50
+TYPEAHEAD_DEFAULT_LIMIT = 8
+TYPEAHEAD_MAX_LIMIT = 20
+TYPEAHEAD_CACHE_TIMEOUT = 60
+
+
+def normalize_typeahead_query(text):
+    """Lowercase and collapse whitespace so equivalent prefixes share a cache entry"""
+    return ' '.join(text.lower().split())[:TYPEAHEAD_MAX_LENGTH]
+
+
+def _project_suggestions(q, limit):
+    projects = Project.objects.filter(
+        title__trigram_word_similar=q
+    ).annotate(
+        score=TrigramWordSimilarity(q, 'title')
+    ).order_by('-score', '-views_count').values('id', 'title', 'slug', 'score')[:limit]
+
+    return [{
+        'type': 'project',
+        'id': p['id'],
+        'label': p['title'],
+        'slug': p['slug'],
+        'url': reverse('project_detail', args=[p['slug']]),
+        'score': p['score'],
+    } for p in projects]
+
+
+def _user_suggestions(q, limit):
+    # Each OR branch is answered by its own trigram index and combined as a bitmap
+    users = User.objects.filter(
+        Q(username__trigram_word_similar=q) |
+        Q(first_name__trigram_word_similar=q) |
+        Q(last_name__trigram_word_similar=q)
+    ).annotate(
+        score=Greatest(
+            TrigramWordSimilarity(q, 'username'),
+            TrigramWordSimilarity(q, 'first_name'),
+            TrigramWordSimilarity(q, 'last_name'),
+        )
+    ).order_by('-score').values('id', 'username', 'first_name', 'last_name', 'score')[:limit]
+
+    return [{
+        'type': 'user',
+        'id': u['id'],
+        'label': f"{u['first_name']} {u['last_name']}".strip() or u['username'],
+        'username': u['username'],
+        'url': reverse('profile', args=[u['username']]),
+        'score': u['score'],
+    } for u in users]
+
+
+def _tag_suggestions(q, limit):
+    tags = Tag.objects.filter(
+        name__trigram_word_similar=q
+    ).annotate(
+        score=TrigramWordSimilarity(q, 'name')
+    ).order_by('-score').values('id', 'name', 'slug', 'score')[:limit]
+
+    return [{
+        'type': 'tag',
+        'id': t['id'],
+        'label': t['name'],
+        'slug': t['slug'],
+        'url': f"{reverse('explore')}?tags={t['slug']}",
+        'score': t['score'],
+    } for t in tags]
+
+
+def _skill_suggestions(q, limit):
+    skills = Skill.objects.filter(
+        name__trigram_word_similar=q
+    ).annotate(
+        score=TrigramWordSimilarity(q, 'name')
+    ).order_by('-score').values('id', 'name', 'score')[:limit]
+
+    return [{
+        'type': 'skill',
+        'id': s['id'],
+        'label': s['name'],
+        'score': s['score'],
+    } for s in skills]
+
+
+TYPEAHEAD_SOURCES = {
+    'project': _project_suggestions,
+    'user': _user_suggestions,
+    'tag': _tag_suggestions,
+    'skill': _skill_suggestions,
+}
+
+
+def typeahead_suggestions(text, types=TYPEAHEAD_TYPES, limit=TYPEAHEAD_DEFAULT_LIMIT):
+    """Mixed, ranked suggestions for a typed prefix, cached per normalized query"""
+    q = normalize_typeahead_query(text)
+    if len(q) < TYPEAHEAD_MIN_LENGTH:
+        return []
+
+    types = tuple(t for t in TYPEAHEAD_TYPES if t in types)
+    digest = hashlib.md5(q.encode()).hexdigest()
+    cache_key = f"typeahead:{','.join(types)}:{limit}:{digest}"
+    suggestions = cache.get(cache_key)
+    if suggestions is None:
+        suggestions = []
+        for kind in types:
+            suggestions.extend(TYPEAHEAD_SOURCES[kind](q, limit))
+        # Stable sort keeps the source order (projects first) for equal scores
+        suggestions.sort(key=lambda s: s['score'], reverse=True)
+        suggestions = suggestions[:limit]
+        cache.set(cache_key, suggestions, TYPEAHEAD_CACHE_TIMEOUT)
+    return suggestions
@@ -1,5 +1,30 @@
+from django.db import models
 from rest_framework import serializers
 from .models import *
+from .reactions import VIEWER_RELATIONS, attach_viewer_state
+from .search import render_headline
+
+
+class ViewerStateListSerializer(serializers.ListSerializer):
+    """Attaches the requesting user's flags to the whole page before serializing"""
+
+    def to_representation(self, data):
+        items = data.all() if isinstance(data, models.Manager) else data
+        request = self.context.get('request')
+        items = attach_viewer_state(items, request.user if request else None)
+        return super().to_representation(items)
+
+
+class ViewerStateMixin:
+    """Serializer mixin exposing the flags set by attach_viewer_state()"""
+
+    def to_representation(self, instance):
+        # Single objects (detail, create) don't go through the list serializer
+        attr = next(iter(VIEWER_RELATIONS[type(instance)]))
+        if not hasattr(instance, attr):
+            request = self.context.get('request')
+            attach_viewer_state([instance], request.user if request else None)
+        return super().to_representation(instance)
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -29,24 +54,25 @@ class SkillSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'category']
 
 
-class ProjectListSerializer(serializers.ModelSerializer):
+class ProjectListSerializer(ViewerStateMixin, serializers.ModelSerializer):
     """Project list serializer (simplified)"""
     creator = UserSerializer(read_only=True)
     tags = TagSerializer(many=True, read_only=True)
-    supporters_count = serializers.SerializerMethodField()
-    members_count = serializers.SerializerMethodField()
+    search_snippet = serializers.SerializerMethodField()
+    is_supported = serializers.BooleanField(read_only=True)
+    is_member = serializers.BooleanField(read_only=True)
 
     class Meta:
         model = Project
         fields = ['id', 'title', 'slug', 'short_description', 'project_type',
                   'stage', 'status', 'cover_image', 'creator', 'tags',
-                  'supporters_count', 'members_count', 'views_count', 'created_at']
-
-    def get_supporters_count(self, obj):
-        return obj.supporters.count()
+                  'supporters_count', 'members_count', 'views_count', 'created_at',
+                  'search_snippet', 'is_supported', 'is_member']
+        list_serializer_class = ViewerStateListSerializer
 
-    def get_members_count(self, obj):
-        return obj.members.count()
+    def get_search_snippet(self, obj):
+        # Only present when the queryset came through search_projects()
+        return render_headline(getattr(obj, 'search_headline', None))
 
 
 class ProjectDetailSerializer(serializers.ModelSerializer):
@@ -54,14 +80,10 @@ class ProjectDetailSerializer(serializers.ModelSerializer):
     creator = UserSerializer(read_only=True)
     tags = TagSerializer(many=True, read_only=True)
     supporters = UserSerializer(many=True, read_only=True)
-    members_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Project
-        fields = '__all__'
-
-    def get_members_count(self, obj):
-        return obj.members.count()
+        exclude = ['search_vector']
 
 
 class ProjectCreateSerializer(serializers.ModelSerializer):
@@ -73,34 +95,64 @@ class ProjectCreateSerializer(serializers.ModelSerializer):
                   'stage', 'status', 'collaboration_needed', 'cover_image', 'tags']
 
 
-class ThoughtSerializer(serializers.ModelSerializer):
+class ThoughtSerializer(ViewerStateMixin, serializers.ModelSerializer):
     """Thought serializer"""
     user = UserSerializer(read_only=True)
     tags = TagSerializer(many=True, read_only=True)
-    likes_count = serializers.SerializerMethodField()
+    is_liked = serializers.BooleanField(read_only=True)
 
     class Meta:
         model = Thought
-        fields = ['id', 'user', 'content', 'tags', 'likes_count', 'created_at']
-
-    def get_likes_count(self, obj):
-        return obj.likes.count()
+        fields = ['id', 'user', 'content', 'tags', 'likes_count', 'created_at', 'is_liked']
+        list_serializer_class = ViewerStateListSerializer
 
 
 class MessageSerializer(serializers.ModelSerializer):
     """Message serializer"""
     sender = UserSerializer(read_only=True)
     recipient = UserSerializer(read_only=True)
+    # Message.recipient is nullable for team messages, which only post_message() creates
+    recipient_id = serializers.PrimaryKeyRelatedField(
+        source='recipient', queryset=User.objects.all(), write_only=True, required=True, allow_null=False
+    )
+    search_snippet = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Message
+        fields = ['id', 'conversation', 'sender', 'recipient', 'recipient_id', 'subject', 'content',
+                  'is_read', 'created_at', 'read_at', 'search_snippet']
+        read_only_fields = ['id', 'conversation', 'is_read', 'created_at', 'read_at']
+
+    def get_search_snippet(self, obj):
+        # Only present when the queryset came through search_messages()
+        return render_headline(getattr(obj, 'search_headline', None))
+
+
+class MessagePreviewSerializer(serializers.ModelSerializer):
+    """Last message shown in the inbox"""
 
     class Meta:
         model = Message
-        fields = ['id', 'sender', 'recipient', 'subject', 'content',
-                  'is_read', 'created_at', 'read_at']
-        read_only_fields = ['id', 'created_at', 'read_at']
+        fields = ['id', 'sender', 'content', 'created_at']
+
+
+class ConversationSerializer(serializers.ModelSerializer):
+    """Inbox entry, from conversations.inbox_conversations()"""
+    other_user = UserSerializer(read_only=True)
+    last_message = MessagePreviewSerializer(read_only=True)
+    unread_count = serializers.IntegerField(read_only=True)
+    muted = serializers.BooleanField(read_only=True)
+    archived = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = Conversation
+        fields = ['id', 'project', 'other_user', 'last_message', 'unread_count', 'muted', 'archived',
+                  'created_at', 'updated_at']
 
 
 class NotificationSerializer(serializers.ModelSerializer):
     """Notification serializer"""
+    is_read = serializers.SerializerMethodField()
 
     class Meta:
         model = Notification
@@ -108,6 +160,10 @@ class NotificationSerializer(serializers.ModelSerializer):
                   'is_read', 'created_at']
         read_only_fields = ['id', 'created_at']
 
+    def get_is_read(self, obj):
+        # Everything up to the user's read watermark counts as read
+        return obj.is_read or obj.pk <= self.context.get('notifications_read_through', 0)
+
 
 class CommentSerializer(serializers.ModelSerializer):
     """Comment serializer"""
@@ -1,36 +1,17 @@
-from django.db.models.signals import post_save, pre_save, m2m_changed
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.db import transaction
 from django.dispatch import receiver
 from django.utils import timezone
 from .models import *
-
-
-@receiver(post_save, sender=User)
-def calculate_profile_completeness(sender, instance, created, **kwargs):
-    """Calculate profile completeness percentage"""
-    if not created:  # Only for updates, not creation
-        completeness = 0
-        fields = [
-            (instance.first_name, 10),
-            (instance.last_name, 10),
-            (instance.bio, 15),
-            (instance.title, 10),
-            (instance.profile_image, 15),
-            (instance.location, 10),
-            (instance.website or instance.linkedin or instance.github, 10),
-        ]
-
-        for field, weight in fields:
-            if field:
-                completeness += weight
-
-        # Check skills and interests
-        if instance.skills.count() > 0:
-            completeness += 10
-        if instance.interests.count() > 0:
-            completeness += 10
-
-        if instance.profile_completeness != completeness:
-            User.objects.filter(pk=instance.pk).update(profile_completeness=completeness)
+from .search import (
+    MESSAGE_SEARCH_FIELDS, PROJECT_SEARCH_FIELDS, USER_SEARCH_FIELDS,
+    update_message_search_vectors, update_project_search_vectors, update_user_search_vectors,
+)
+from .facets import PROJECT_FACET_FIELDS, loaded_facet_index, project_facet_values
+from .caching import bump_project_version, record_slug_change
+from .trending import PROJECT_TAG_WEIGHT, THOUGHT_TAG_WEIGHT, record_tag_usage, recount_tags
+from .counters import adjust_conversation_unread, adjust_counters, adjust_unread
+from .conversations import add_participants
 
 
 @receiver(post_save, sender=ProjectMembership)
@@ -59,19 +40,6 @@ def notify_project_creator_of_comment(sender, instance, created, **kwargs):
         )
 
 
-@receiver(post_save, sender=Message)
-def notify_user_of_new_message(sender, instance, created, **kwargs):
-    """Notify user of new message"""
-    if created:
-        Notification.objects.create(
-            user=instance.recipient,
-            notification_type='message',
-            title='New message',
-            content=f'You have a new message from {instance.sender.username}',
-            link='/messages/'
-        )
-
-
 @receiver(post_save, sender=Thought)
 def notify_mentioned_users(sender, instance, created, **kwargs):
     """Notify users mentioned in thoughts (if @username is used)"""
@@ -113,34 +81,327 @@ def notify_project_supporters_of_update(sender, instance, created, **kwargs):
             )
 
 
-@receiver(pre_save, sender=Project)
-def update_project_slug_if_title_changed(sender, instance, **kwargs):
-    """Update slug if title changes"""
-    if instance.pk:
-        try:
-            old_instance = Project.objects.get(pk=instance.pk)
-            if old_instance.title != instance.title:
-                from django.utils.text import slugify
-                base_slug = slugify(instance.title)
-                slug = base_slug
-                counter = 1
+@receiver(post_save, sender=Project)
+def record_project_slug_history(sender, instance, created, **kwargs):
+    """Keep a renamed project reachable at its old slug"""
+    # The loaded values are only replaced once the save, signals included, is done
+    old_slug = instance.loaded_value('slug')
+    if not created and old_slug and old_slug != instance.slug:
+        record_slug_change(instance, old_slug)
 
-                # Ensure unique slug
-                while Project.objects.filter(slug=slug).exclude(pk=instance.pk).exists():
-                    slug = f"{base_slug}-{counter}"
-                    counter += 1
 
-                instance.slug = slug
-        except Project.DoesNotExist:
-            pass
+@receiver(post_save, sender=Project)
+def refresh_project_search_vector(sender, instance, update_fields=None, **kwargs):
+    """Keep the full-text search vector in sync with the searchable columns"""
+    if update_fields is not None and not PROJECT_SEARCH_FIELDS.intersection(update_fields):
+        return
+    update_project_search_vectors([instance.pk])
 
 
-@receiver(m2m_changed, sender=Project.supporters.through)
-def update_support_count(sender, instance, action, **kwargs):
-    """Could be used to cache supporter count if needed"""
+@receiver(m2m_changed, sender=Project.tags.through)
+def refresh_search_vector_on_tag_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Tag names are part of the project search vector"""
+    if reverse and action == 'pre_clear':
+        # Remember which projects lose the tag before the rows disappear
+        instance._search_cleared_project_ids = list(instance.projects.values_list('pk', flat=True))
+        return
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+
+    if not reverse:
+        update_project_search_vectors([instance.pk])
+    elif action == 'post_clear':
+        update_project_search_vectors(getattr(instance, '_search_cleared_project_ids', []))
+    else:
+        update_project_search_vectors(pk_set or [])
+
+
+@receiver(post_save, sender=Tag)
+def refresh_search_vectors_on_tag_rename(sender, instance, created, **kwargs):
+    """Renaming a tag changes the indexed text of every project using it"""
+    if not created:
+        update_project_search_vectors(instance.projects.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=User)
+def refresh_user_search_vector(sender, instance, update_fields=None, **kwargs):
+    """Keep the people search vector in sync with the searchable columns"""
+    if update_fields is not None and not USER_SEARCH_FIELDS.intersection(update_fields):
+        return
+    update_user_search_vectors([instance.pk])
+
+
+@receiver(m2m_changed, sender=User.skills.through)
+def refresh_user_search_vector_on_skill_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Skill names are part of the people search vector"""
+    if reverse and action == 'pre_clear':
+        instance._search_cleared_user_ids = list(instance.users.values_list('pk', flat=True))
+        return
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+
+    if not reverse:
+        update_user_search_vectors([instance.pk])
+    elif action == 'post_clear':
+        update_user_search_vectors(getattr(instance, '_search_cleared_user_ids', []))
+    else:
+        update_user_search_vectors(pk_set or [])
+
+
+@receiver(post_save, sender=Skill)
+def refresh_user_search_vectors_on_skill_rename(sender, instance, created, **kwargs):
+    if not created:
+        update_user_search_vectors(instance.users.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Message)
+def refresh_message_search_vector(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not MESSAGE_SEARCH_FIELDS.intersection(update_fields):
+        return
+    update_message_search_vectors([instance.pk])
+
+
+@receiver(post_save, sender=Project)
+def update_facet_index(sender, instance, update_fields=None, **kwargs):
+    """Move the project between facet bitmaps when a facet column changes"""
+    index = loaded_facet_index()
+    if index is None:
+        return
+    if update_fields is not None and not PROJECT_FACET_FIELDS.intersection(update_fields):
+        return
+    project_id, values = instance.pk, project_facet_values(instance)
+    transaction.on_commit(lambda: index.index_project(project_id, values))
+
+
+@receiver(post_delete, sender=Project)
+def remove_from_facet_index(sender, instance, **kwargs):
+    index = loaded_facet_index()
+    if index is not None:
+        project_id = instance.pk
+        transaction.on_commit(lambda: index.remove_project(project_id))
+
+
+@receiver(m2m_changed, sender=Project.tags.through)
+def update_facet_index_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep tag bitmaps in sync with project tag assignments"""
+    index = loaded_facet_index()
+    if index is None or action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+
+    if action == 'post_clear':
+        if reverse:
+            update, args = index.clear_tag, (instance.pk,)
+        else:
+            update, args = index.remove_tags, ([instance.pk],)
+    elif reverse:
+        # instance is a Tag, pk_set holds project ids
+        update = index.add_tags if action == 'post_add' else index.remove_tags
+        args = (set(pk_set), [instance.pk])
+    else:
+        update = index.add_tags if action == 'post_add' else index.remove_tags
+        args = ([instance.pk], set(pk_set))
+    transaction.on_commit(lambda: update(*args))
+
+
+@receiver(post_save, sender=Tag)
+def update_facet_index_tag_slug(sender, instance, **kwargs):
+    index = loaded_facet_index()
+    if index is not None:
+        tag_id, slug = instance.pk, instance.slug
+        transaction.on_commit(lambda: index.set_tag_slug(tag_id, slug))
+
+
+@receiver(post_delete, sender=Tag)
+def remove_tag_from_facet_index(sender, instance, **kwargs):
+    index = loaded_facet_index()
+    if index is not None:
+        tag_id = instance.pk
+        transaction.on_commit(lambda: index.clear_tag(tag_id))
+
+
+@receiver(post_save, sender=User)
+def sync_creator_user_type(sender, instance, created, update_fields=None, **kwargs):
+    """Copy a changed user type onto the user's projects and their facet bitmaps"""
+    if created or (update_fields is not None and 'user_type' not in update_fields):
+        return
+    projects = Project.objects.filter(creator=instance).exclude(creator_user_type=instance.user_type)
+    project_ids = list(projects.values_list('pk', flat=True))
+    if not project_ids:
+        return
+    Project.objects.filter(pk__in=project_ids).update(creator_user_type=instance.user_type)
+
+    index = loaded_facet_index()
+    if index is not None:
+        user_type = instance.user_type
+
+        def reindex():
+            for project_id in project_ids:
+                index.index_project(project_id, {'user_type': user_type})
+        transaction.on_commit(reindex)
+    bump_project_version()
+
+
+@receiver(post_save, sender=Project)
+def invalidate_project_listings(sender, instance, update_fields=None, **kwargs):
+    """Drop cached listings; view count bumps alone don't reorder enough to matter"""
+    if update_fields is not None and set(update_fields) <= {'views_count'}:
+        return
+    bump_project_version()
+
+
+@receiver(post_delete, sender=Project)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=ProjectMembership)
+@receiver(post_delete, sender=ProjectMembership)
+def invalidate_project_listings_on_change(sender, **kwargs):
+    bump_project_version()
+
+
+@receiver(m2m_changed, sender=Project.tags.through)
+def invalidate_project_listings_on_tag_change(sender, action, **kwargs):
     if action in ['post_add', 'post_remove', 'post_clear']:
-        # Update cached count or trigger other actions
-        pass
+        bump_project_version()
+
+
+def _update_tag_stats(instance, action, reverse, pk_set, count_field, weight):
+    if action == 'pre_clear' and not reverse:
+        instance._stats_cleared_tag_ids = list(instance.tags.values_list('pk', flat=True))
+        return
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+
+    if reverse:
+        # instance is a Tag, pk_set holds content ids
+        tag_ids = [instance.pk]
+    elif action == 'post_clear':
+        tag_ids = getattr(instance, '_stats_cleared_tag_ids', [])
+    else:
+        tag_ids = pk_set
+
+    if action == 'post_add':
+        count = len(pk_set) if reverse else 1
+        record_tag_usage(tag_ids, count_field, count, weight * count)
+    else:
+        # Removals may name tags that weren't set, so count them exactly
+        recount_tags(tag_ids)
+
+
+@receiver(m2m_changed, sender=Project.tags.through)
+def update_tag_stats_for_projects(sender, instance, action, reverse, pk_set, **kwargs):
+    _update_tag_stats(instance, action, reverse, pk_set, 'projects_count', PROJECT_TAG_WEIGHT)
+
+
+@receiver(m2m_changed, sender=Thought.tags.through)
+def update_tag_stats_for_thoughts(sender, instance, action, reverse, pk_set, **kwargs):
+    _update_tag_stats(instance, action, reverse, pk_set, 'thoughts_count', THOUGHT_TAG_WEIGHT)
+
+
+@receiver(pre_delete, sender=Project)
+@receiver(pre_delete, sender=Thought)
+def remember_tags_before_delete(sender, instance, **kwargs):
+    """Deleting content drops its tag rows without an m2m_changed signal"""
+    instance._stats_deleted_tag_ids = list(instance.tags.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Project)
+@receiver(post_delete, sender=Thought)
+def recount_tags_after_delete(sender, instance, **kwargs):
+    recount_tags(getattr(instance, '_stats_deleted_tag_ids', []))
+
+
+def _m2m_counter_delta(instance, action, reverse, pk_set, forward_name, reverse_name):
+    """(ids, delta) for the rows whose counter an m2m change moves; a delta of None resets it"""
+    related = getattr(instance, reverse_name if reverse else forward_name)
+    cleared, removed = f'_counter_cleared_{reverse_name}', f'_counter_removed_{reverse_name}'
+    if reverse and action == 'pre_clear':
+        setattr(instance, cleared, list(related.values_list('pk', flat=True)))
+    if action == 'pre_remove':
+        # remove() is handed ids that may never have been related; only existing rows count
+        setattr(instance, removed, list(related.filter(pk__in=pk_set).values_list('pk', flat=True)))
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return [], 0
+    if action == 'post_remove':
+        pk_set = getattr(instance, removed, [])
+    sign = 1 if action == 'post_add' else -1
+    if not reverse:
+        # pk_set on post_add holds only the rows actually inserted
+        return [instance.pk], None if action == 'post_clear' else sign * len(pk_set or ())
+    if action == 'post_clear':
+        return getattr(instance, cleared, []), -1
+    return pk_set or [], sign
+
+
+@receiver(m2m_changed, sender=Project.supporters.through)
+def update_support_count(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep Project.supporters_count in sync"""
+    project_ids, delta = _m2m_counter_delta(instance, action, reverse, pk_set, 'supporters', 'supported_projects')
+    adjust_counters(Project, project_ids, 'supporters_count', delta)
+
+
+@receiver(m2m_changed, sender=Thought.likes.through)
+def update_likes_count(sender, instance, action, reverse, pk_set, **kwargs):
+    thought_ids, delta = _m2m_counter_delta(instance, action, reverse, pk_set, 'likes', 'liked_thoughts')
+    adjust_counters(Thought, thought_ids, 'likes_count', delta)
+
+
+def _adjust_profile_counter(instance, action, reverse, pk_set, forward_name, reverse_name, field):
+    # Rescores profile completeness in the same UPDATE
+    user_ids, delta = _m2m_counter_delta(instance, action, reverse, pk_set, forward_name, reverse_name)
+    if not adjust_counters(User, user_ids, field, delta) or reverse:
+        return
+    # Follow the UPDATE in memory rather than reading the row back
+    setattr(instance, field, 0 if delta is None else getattr(instance, field) + delta)
+    instance.profile_completeness = instance.compute_profile_completeness()
+    instance._remember_fields([field, 'profile_completeness'])
+
+
+@receiver(m2m_changed, sender=User.skills.through)
+def update_skills_count(sender, instance, action, reverse, pk_set, **kwargs):
+    _adjust_profile_counter(instance, action, reverse, pk_set, 'skills', 'users', 'skills_count')
+
+
+@receiver(m2m_changed, sender=User.interests.through)
+def update_interests_count(sender, instance, action, reverse, pk_set, **kwargs):
+    _adjust_profile_counter(instance, action, reverse, pk_set, 'interests', 'interested_users', 'interests_count')
+
+
+@receiver(post_save, sender=ProjectMembership)
+@receiver(post_delete, sender=ProjectMembership)
+def update_members_count(sender, instance, **kwargs):
+    if kwargs.get('created') is not False:
+        adjust_counters(Project, [instance.project_id], 'members_count', 1 if kwargs.get('created') else -1)
+
+
+@receiver(post_save, sender=ProjectMembership)
+@receiver(post_delete, sender=ProjectMembership)
+def sync_project_conversation(sender, instance, **kwargs):
+    """Keep a project's team conversation in step with its members"""
+    created = kwargs.get('created')
+    if created is False:
+        return
+    conversation = Conversation.objects.filter(project_id=instance.project_id).first()
+    if conversation is None:
+        return
+    if created:
+        add_participants(conversation, [instance.user_id])
+    elif conversation.memberships.filter(user_id=instance.user_id).delete()[0]:
+        # The one who left may have held back messages the rest have deleted
+        Conversation.objects.filter(pk=conversation.pk).update(purge_pending=True)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def update_comments_count(sender, instance, **kwargs):
+    if kwargs.get('created') is not False:
+        adjust_counters(Project, [instance.project_id], 'comments_count', 1 if kwargs.get('created') else -1)
+
+
+@receiver(post_save, sender=ProjectUpdate)
+@receiver(post_delete, sender=ProjectUpdate)
+def update_updates_count(sender, instance, **kwargs):
+    if kwargs.get('created') is not False:
+        adjust_counters(Project, [instance.project_id], 'updates_count', 1 if kwargs.get('created') else -1)
 
 
 # Signal to mark messages as read when conversation is opened
@@ -149,3 +410,41 @@ def mark_conversation_messages_read(sender, instance, created, **kwargs):
     """Mark messages in a conversation as read when user opens it"""
     # This would be better handled in the view, but kept here as example
     pass
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+def update_unread_messages(sender, instance, **kwargs):
+    """Count new unread messages; read transitions go through mark_messages_read()"""
+    created = kwargs.get('created')
+    # Team conversation messages have no recipient; they are counted per conversation only
+    if created is not False and not instance.is_read and instance.recipient_id is not None:
+        adjust_unread(instance.recipient_id, 'unread_messages', 1 if created else -1)
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+def update_conversation_unread(sender, instance, **kwargs):
+    """Count messages against every other participant's place in the conversation"""
+    created = kwargs.get('created')
+    if created is False or instance.conversation_id is None:
+        return
+    # A deleted message its recipient had read was already taken off their count
+    read_by = instance.recipient_id if not created and instance.is_read else None
+    args = (instance.conversation_id, instance.sender_id, instance.pk, 1 if created else -1, read_by)
+    # Outside the message's transaction: fan-out to a large team runs as short batches
+    transaction.on_commit(lambda: adjust_conversation_unread(*args))
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def update_unread_notifications(sender, instance, **kwargs):
+    """Count new unread notifications; read transitions go through mark_notifications_read()"""
+    created = kwargs.get('created')
+    if instance.is_read or created is False:
+        return
+    if created:
+        adjust_unread(instance.user_id, 'unread_notifications', 1)
+    else:
+        # Only notifications above the read watermark were counted
+        adjust_unread(instance.user_id, 'unread_notifications', -1, notifications_read_through__lt=instance.pk)
@@ -80,18 +80,34 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
 
-    // Global search
+    // Global search: suggestions while typing, full search on Enter
     const searchInput = document.getElementById('globalSearch');
     if (searchInput) {
-        let searchTimeout;
-        searchInput.addEventListener('input', function() {
-            clearTimeout(searchTimeout);
-            searchTimeout = setTimeout(() => {
+        setupTypeahead(searchInput);
+        searchInput.addEventListener('keydown', function(e) {
+            if (e.key === 'Enter') {
                 performSearch(this.value);
-            }, 500);
+            }
         });
     }
 
+    // Pickers (tags, skills, interests) that check the chosen checkbox
+    document.querySelectorAll('[data-typeahead]').forEach(input => {
+        const target = document.getElementById(input.dataset.typeaheadTarget);
+        setupTypeahead(input, {
+            types: input.dataset.typeahead,
+            onSelect: item => {
+                const checkbox = target && target.querySelector(`input[type="checkbox"][value="${item.id}"]`);
+                if (checkbox) {
+                    checkbox.checked = true;
+                    checkbox.dispatchEvent(new Event('change', { bubbles: true }));
+                    checkbox.scrollIntoView({ behavior: 'smooth', block: 'nearest' });
+                }
+                input.value = '';
+            }
+        });
+    });
+
     // Filter checkboxes
     const filterCheckboxes = document.querySelectorAll('.checkbox-label input[type="checkbox"]');
     filterCheckboxes.forEach(checkbox => {
@@ -127,7 +143,9 @@ function loadTabContent(tabName) {
     if (tabName === 'ideas') {
         endpoint += '?project_type=idea';
     } else if (tabName === 'people') {
-        endpoint = '/api/users/';
+        // Carry the explore search box over to the people directory
+        const search = new URLSearchParams(window.location.search).get('search');
+        endpoint = '/api/users/' + (search ? `?search=${encodeURIComponent(search)}` : '');
     }
 
     fetch(endpoint)
@@ -135,8 +153,10 @@ function loadTabContent(tabName) {
         .then(data => {
             if (tabName === 'people') {
                 renderPeople(data.results || data);
+                nextPageUrl = null;
             } else {
                 renderProjects(data.results || data);
+                nextPageUrl = data.next || null;
             }
         })
         .catch(error => {
@@ -187,11 +207,12 @@ function renderProjects(projects) {
                         ${renderAvatars(project.creator)}
                     </div>
                     <div class="project-actions">
-                        <button class="action-btn" onclick="joinProject('${project.slug}')">
-                            <i class="fas fa-user-plus"></i> Join
-                        </button>
-                        <button class="action-btn" onclick="supportProject('${project.slug}')">
-                            <i class="fas fa-heart"></i> Support
+                        ${project.is_member ?
+                            `<button class="action-btn active" disabled><i class="fas fa-check"></i> Member</button>` :
+                            `<button class="action-btn" onclick="joinProject('${project.slug}')"><i class="fas fa-user-plus"></i> Join</button>`
+                        }
+                        <button class="action-btn${project.is_supported ? ' active' : ''}" onclick="supportProject('${project.slug}')">
+                            <i class="${project.is_supported ? 'fas' : 'far'} fa-heart"></i> ${project.is_supported ? 'Supported' : 'Support'}
                         </button>
                         <button class="action-btn">
                             <i class="fas fa-comment"></i> Chat
@@ -285,6 +306,99 @@ function performSearch(query) {
     window.location.href = `?${params.toString()}`;
 }
 
+// Escape text before inserting it as HTML
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+}
+
+// Typeahead suggestions from /api/typeahead/
+function setupTypeahead(input, options = {}) {
+    const menu = document.createElement('div');
+    menu.className = 'typeahead-menu';
+    input.parentElement.classList.add('typeahead-field');
+    input.parentElement.appendChild(menu);
+
+    let results = [];
+    let activeIndex = -1;
+
+    function render() {
+        menu.innerHTML = results.map((item, index) => `
+            <a href="${item.url || '#'}" data-index="${index}" class="${index === activeIndex ? 'active' : ''}">
+                <span class="typeahead-type">${item.type}</span>
+                <span>${escapeHtml(item.label)}</span>
+            </a>
+        `).join('');
+        menu.classList.toggle('show', results.length > 0);
+    }
+
+    function choose(item) {
+        menu.classList.remove('show');
+        if (options.onSelect) {
+            options.onSelect(item);
+        } else if (item.url) {
+            window.location.href = item.url;
+        }
+    }
+
+    const fetchSuggestions = debounce(query => {
+        if (query.length < 2) {
+            results = [];
+            render();
+            return;
+        }
+
+        const params = new URLSearchParams({ q: query });
+        if (options.types) {
+            params.set('types', options.types);
+        }
+
+        fetch(`/api/typeahead/?${params.toString()}`)
+            .then(response => response.json())
+            .then(data => {
+                // Ignore responses for a query the user has already typed past
+                if (input.value.trim() !== query) return;
+                results = data.results || [];
+                activeIndex = -1;
+                render();
+            })
+            .catch(error => console.error('Typeahead error:', error));
+    }, 150);
+
+    input.setAttribute('autocomplete', 'off');
+    input.addEventListener('input', () => fetchSuggestions(input.value.trim()));
+
+    input.addEventListener('keydown', e => {
+        if (!menu.classList.contains('show')) return;
+
+        if (e.key === 'ArrowDown' || e.key === 'ArrowUp') {
+            e.preventDefault();
+            const step = e.key === 'ArrowDown' ? 1 : -1;
+            activeIndex = (activeIndex + step + results.length) % results.length;
+            render();
+        } else if (e.key === 'Enter' && activeIndex >= 0) {
+            e.preventDefault();
+            e.stopImmediatePropagation();
+            choose(results[activeIndex]);
+        } else if (e.key === 'Escape') {
+            menu.classList.remove('show');
+        }
+    });
+
+    // mousedown fires before the input loses focus
+    menu.addEventListener('mousedown', e => {
+        const link = e.target.closest('a');
+        if (!link) return;
+        e.preventDefault();
+        choose(results[link.dataset.index]);
+    });
+
+    input.addEventListener('blur', () => {
+        setTimeout(() => menu.classList.remove('show'), 150);
+    });
+}
+
 // Support project
 function supportProject(slug) {
     fetch(`/projects/${slug}/support/`, {
@@ -347,9 +461,12 @@ function bookmarkProject(slug) {
 
 // Load more functionality (infinite scroll)
 let isLoading = false;
-let currentPage = 1;
+let nextPageUrl = null;
 
 function setupInfiniteScroll() {
+    // The server renders the first page and hands over the cursor for the next one
+    nextPageUrl = document.getElementById('projectsGrid').dataset.nextUrl || null;
+
     window.addEventListener('scroll', () => {
         if (isLoading) return;
 
@@ -364,18 +481,16 @@ function setupInfiniteScroll() {
 }
 
 function loadMoreProjects() {
+    if (!nextPageUrl) return;
     isLoading = true;
-    currentPage++;
 
-    const params = new URLSearchParams(window.location.search);
-    params.set('page', currentPage);
-
-    fetch(`/api/projects/?${params.toString()}`)
+    fetch(nextPageUrl)
         .then(response => response.json())
         .then(data => {
             if (data.results && data.results.length > 0) {
                 appendProjects(data.results);
             }
+            nextPageUrl = data.next;
             isLoading = false;
         })
         .catch(error => {
@@ -416,11 +531,12 @@ function appendProjects(projects) {
                         ${renderAvatars(project.creator)}
                     </div>
                     <div class="project-actions">
-                        <button class="action-btn" onclick="joinProject('${project.slug}')">
-                            <i class="fas fa-user-plus"></i> Join
-                        </button>
-                        <button class="action-btn" onclick="supportProject('${project.slug}')">
-                            <i class="fas fa-heart"></i> Support
+                        ${project.is_member ?
+                            `<button class="action-btn active" disabled><i class="fas fa-check"></i> Member</button>` :
+                            `<button class="action-btn" onclick="joinProject('${project.slug}')"><i class="fas fa-user-plus"></i> Join</button>`
+                        }
+                        <button class="action-btn${project.is_supported ? ' active' : ''}" onclick="supportProject('${project.slug}')">
+                            <i class="${project.is_supported ? 'fas' : 'far'} fa-heart"></i> ${project.is_supported ? 'Supported' : 'Support'}
                         </button>
                         <button class="action-btn">
                             <i class="fas fa-comment"></i> Chat
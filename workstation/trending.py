@@ -0,0 +1,196 @@
+"""
+Trending tags and projects.
+
+A tag's trending activity is the sum of its usage events, each decaying with
+a half-life of TRENDING_HALF_LIFE_DAYS. Instead of decaying every row on a
+schedule, an event at time t is weighted up by 2 ** ((t - TRENDING_EPOCH) /
+half-life) and the score keeps the log of the sum. Scores of different tags
+stay comparable without ever being rewritten, and recording an event is a
+log-add-exp done in a single UPDATE.
+
+Project hotness is recomputed in batch by the recompute_trending command:
+engagement counts for every project are loaded into NumPy arrays, scored in
+one vectorized pass and written back with a single UPDATE per batch.
+"""
+import math
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, F, FloatField, OuterRef, Subquery, Value
+from django.db.models.functions import Abs, Coalesce, Exp, Extract, Greatest, Ln
+from django.utils import timezone
+
+from .models import Comment, Project, ProjectMembership, ProjectUpdate, Tag, TagStats, Thought
+from .caching import bump_project_version
+
+TRENDING_EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+# Weight of one tag assignment on each kind of content
+PROJECT_TAG_WEIGHT = 1.0
+THOUGHT_TAG_WEIGHT = 0.5
+
+
+def activity_score(weight, when=None):
+    """Log-space score of an event of `weight` happening at `when`"""
+    when = when or timezone.now()
+    half_life = getattr(settings, 'TRENDING_HALF_LIFE_DAYS', 7) * 86400
+    return math.log(weight) + math.log(2) * (when - TRENDING_EPOCH).total_seconds() / half_life
+
+
+def _logaddexp(field, value):
+    """SQL log(exp(field) + exp(value)); a NULL field means no activity yet"""
+    value = Value(value, output_field=FloatField())
+    # GREATEST skips NULLs in Postgres, the correction term is NULL and coalesced away
+    correction = Ln(Value(1.0) + Exp(-Abs(F(field) - value)))
+    return Greatest(F(field), value) + Coalesce(correction, Value(0.0))
+
+
+def _logsumexp(values):
+    top = max(values)
+    return top + math.log(sum(math.exp(value - top) for value in values))
+
+
+def record_tag_usage(tag_ids, count_field, count=1, weight=None):
+    """Add `count` to a usage counter of the tags and fold `weight` into their score"""
+    tag_ids = list(tag_ids)
+    if not tag_ids:
+        return
+    TagStats.objects.bulk_create([TagStats(tag_id=tag_id) for tag_id in tag_ids], ignore_conflicts=True)
+
+    updates = {count_field: F(count_field) + count, 'updated_at': timezone.now()}
+    if weight:
+        updates['trending_score'] = _logaddexp('trending_score', activity_score(weight))
+    TagStats.objects.filter(tag_id__in=tag_ids).update(**updates)
+
+
+def _usage_count(through):
+    counts = through.objects.filter(
+        tag_id=OuterRef('tag_id')
+    ).order_by().values('tag_id').annotate(n=Count('pk')).values('n')
+    return Coalesce(Subquery(counts), 0)
+
+
+def recount_tags(tag_ids=None):
+    """Recompute usage counts from the m2m tables, for some tags or all of them"""
+    stats = TagStats.objects.all()
+    if tag_ids is not None:
+        stats = stats.filter(tag_id__in=list(tag_ids))
+    return stats.update(
+        projects_count=_usage_count(Project.tags.through),
+        thoughts_count=_usage_count(Thought.tags.through),
+        updated_at=timezone.now(),
+    )
+
+
+def rebuild_tag_stats():
+    """Recreate counts and scores for every tag, dating each use by its content"""
+    tag_ids = Tag.objects.values_list('pk', flat=True)
+    TagStats.objects.bulk_create([TagStats(tag_id=tag_id) for tag_id in tag_ids], ignore_conflicts=True)
+    recount_tags()
+
+    events = defaultdict(list)
+    sources = [
+        (Project.tags.through.objects.values_list('tag_id', 'project__created_at'), PROJECT_TAG_WEIGHT),
+        (Thought.tags.through.objects.values_list('tag_id', 'thought__created_at'), THOUGHT_TAG_WEIGHT),
+    ]
+    for rows, weight in sources:
+        for tag_id, created_at in rows.iterator(chunk_size=10000):
+            events[tag_id].append(activity_score(weight, created_at))
+
+    TagStats.objects.exclude(tag_id__in=list(events)).update(trending_score=None)
+    TagStats.objects.bulk_update(
+        [TagStats(tag_id=tag_id, trending_score=_logsumexp(scores)) for tag_id, scores in events.items()],
+        ['trending_score'],
+        batch_size=1000,
+    )
+    return len(events)
+
+
+def trending_tags(limit):
+    """Top tags by trending score, read straight off the score index"""
+    stats = TagStats.objects.filter(
+        trending_score__isnull=False
+    ).select_related('tag').order_by(F('trending_score').desc(nulls_last=True))[:limit]
+    return [stat.tag for stat in stats]
+
+
+# Trending projects
+
+# Engagement weights; views are log-damped so a traffic spike can't dominate
+TRENDING_WEIGHTS = {
+    'views': 1.0,
+    'supporters': 3.0,
+    'members': 4.0,
+    'comments': 2.0,
+    'updates': 2.0,
+}
+# How fast hotness falls with age, as in (age_hours + 2) ** gravity
+TRENDING_GRAVITY = 1.5
+
+_WRITE_SCORES_SQL = """
+    UPDATE projects SET trending_score = batch.score
+    FROM unnest(%s::bigint[], %s::double precision[]) AS batch(id, score)
+    WHERE projects.id = batch.id
+"""
+
+
+def compute_trending_scores(views, supporters, members, comments, updates, age_hours):
+    """Hotness of every project from aligned engagement arrays"""
+    engagement = (
+        TRENDING_WEIGHTS['views'] * np.log1p(views) +
+        TRENDING_WEIGHTS['supporters'] * supporters +
+        TRENDING_WEIGHTS['members'] * members +
+        TRENDING_WEIGHTS['comments'] * comments +
+        TRENDING_WEIGHTS['updates'] * updates
+    )
+    return engagement / np.power(np.maximum(age_hours, 0) + 2, TRENDING_GRAVITY)
+
+
+def _aligned_counts(ids, rows):
+    """Array aligned with the sorted `ids` from (project_id, count) rows"""
+    counts = np.zeros(len(ids))
+    rows = np.array(list(rows), dtype=np.int64).reshape(-1, 2)
+    positions = np.searchsorted(ids, rows[:, 0])
+    # Rows for projects created after `ids` was loaded have no slot
+    found = positions < len(ids)
+    found[found] = ids[positions[found]] == rows[found, 0]
+    counts[positions[found]] = rows[found, 1]
+    return counts
+
+
+def _count_by_project(queryset):
+    return queryset.order_by().values('project_id').annotate(n=Count('pk')).values_list('project_id', 'n')
+
+
+def recompute_project_trending(batch_size=50000):
+    """Rescore every project; returns the number of projects written"""
+    rows = Project.objects.order_by('pk').annotate(
+        created=Extract('created_at', 'epoch')
+    ).values_list('pk', 'views_count', 'created')
+    projects = np.array(list(rows), dtype=np.float64).reshape(-1, 3)
+    ids = projects[:, 0].astype(np.int64)
+    if not len(ids):
+        return 0
+
+    since = timezone.now() - timedelta(days=getattr(settings, 'TRENDING_WINDOW_DAYS', 7))
+    scores = compute_trending_scores(
+        views=projects[:, 1],
+        supporters=_aligned_counts(ids, _count_by_project(Project.supporters.through.objects)),
+        members=_aligned_counts(ids, _count_by_project(ProjectMembership.objects.filter(joined_at__gte=since))),
+        comments=_aligned_counts(ids, _count_by_project(Comment.objects.filter(created_at__gte=since))),
+        updates=_aligned_counts(ids, _count_by_project(ProjectUpdate.objects.filter(created_at__gte=since))),
+        age_hours=(time.time() - projects[:, 2]) / 3600,
+    )
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), batch_size):
+            cursor.execute(_WRITE_SCORES_SQL, [
+                ids[start:start + batch_size].tolist(),
+                scores[start:start + batch_size].tolist(),
+            ])
+    bump_project_version()
+    return len(ids)
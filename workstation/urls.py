@@ -18,6 +18,7 @@ urlpatterns = [
     path('projects/<slug:slug>/edit/', views.edit_project, name='edit_project'),
     path('projects/<slug:slug>/support/', views.support_project, name='support_project'),
     path('projects/<slug:slug>/join/', views.join_project, name='join_project'),
+    path('projects/<slug:slug>/conversation/', views.project_conversation, name='project_conversation'),
 
     # User profiles
     path('users/<str:username>/', views.profile, name='profile'),
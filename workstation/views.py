@@ -1,79 +1,166 @@
+from datetime import timedelta
+from itertools import groupby
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, authenticate, logout
 from django.contrib import messages
-from django.db.models import Q, Count
-from django.http import JsonResponse
+from django.db.models import Q, F
+from django.http import Http404, JsonResponse
 from django.views.decorators.http import require_POST
 from django.core.paginator import Paginator
+from django.urls import reverse
 from .models import *
 from .forms import *
 from django.utils import timezone
 from .forms import *
+from .search import search_projects, render_headline
+from .pagination import KeysetPaginator
+from .facets import facet_page, get_facet_index
+from .counters import (
+    advance_notification_watermark, mark_conversation_read, mark_notifications_read, unread_counts, unread_notifications,
+)
+from .caching import current_project_slug, get_cached_page, listing_cache_key, set_cached_page
+from .filters import DEFAULT_SORT, PROJECT_SORTS, resolve_sort
+from .trending import trending_tags
+from .buffers import record_project_view
+from .reactions import attach_viewer_state, set_project_support
+from .conversations import (
+    delete_conversation_for, get_or_create_conversation, get_or_create_project_conversation, inbox,
+    inbox_conversations, post_message, thread_messages, visible_messages,
+)
 
 
 def home(request):
     """Landing page"""
-    featured_projects = Project.objects.filter(is_featured=True)[:6]
-    recent_projects = Project.objects.all()[:9]
-    trending_tags = Tag.objects.annotate(
-        project_count=Count('projects')
-    ).order_by('-project_count')[:10]
+    featured_projects = attach_viewer_state(Project.objects.filter(is_featured=True)[:6], request.user)
+    recent_projects = attach_viewer_state(Project.objects.all()[:9], request.user)
 
     context = {
         'featured_projects': featured_projects,
         'recent_projects': recent_projects,
-        'trending_tags': trending_tags,
+        'trending_tags': trending_tags(10),
     }
     return render(request, 'workstation/home.html', context)
 
 
-def explore(request):
-    """Explore page with filters"""
-    projects = Project.objects.all()
+def _cursor_query(request, cursor):
+    """Current query string pointing at another cursor page"""
+    if not cursor:
+        return ''
+    params = request.GET.copy()
+    params.pop('page', None)
+    params['cursor'] = cursor
+    return params.urlencode()
 
-    # Filters
-    user_type = request.GET.get('user_type', '')
-    stage = request.GET.get('stage', '')
-    status = request.GET.get('status', '')
-    tags = request.GET.getlist('tags')
-    search = request.GET.get('search', '')
 
-    if user_type:
-        projects = projects.filter(creator__user_type=user_type)
+def _explore_api_url(request, cursor):
+    """API url continuing the explore listing, used by infinite scroll"""
+    if not cursor:
+        return ''
+    params = request.GET.copy()
+    params.pop('page', None)
+    params['cursor'] = cursor
+    return f"{reverse('project-list')}?{params.urlencode()}"
+
+
+# Explore facet -> ORM lookup for the SQL fallback path
+EXPLORE_FACET_LOOKUPS = {
+    'stage': 'stage__in',
+    'status': 'status__in',
+    'project_type': 'project_type__in',
+    'collaboration_needed': 'collaboration_needed__in',
+    'user_type': 'creator_user_type__in',
+    'tags': 'tags__slug__in',
+}
+
 
-    if stage:
-        projects = projects.filter(stage=stage)
+def _facet_options(choices, counts, selected):
+    """Checkbox options for one facet with their result counts"""
+    return [
+        {'value': value, 'label': label, 'count': counts.get(value, 0), 'selected': value in selected}
+        for value, label in choices
+    ]
 
-    if status:
-        projects = projects.filter(status=status)
 
-    if tags:
-        projects = projects.filter(tags__slug__in=tags).distinct()
+def _explore_page(request, filters, search, sort):
+    """One page of explore results for the given filters"""
+    if not search and sort in ('', DEFAULT_SORT) and 'page' not in request.GET:
+        # Newest first: answered from the bitmap index, SQL only loads the page
+        return facet_page(filters, request.GET.get('cursor'), 12)
+
+    projects = Project.objects.all()
+    for facet, selected in filters.items():
+        if selected:
+            projects = projects.filter(**{EXPLORE_FACET_LOOKUPS[facet]: selected})
+    if filters['tags']:
+        projects = projects.distinct()
 
     if search:
-        projects = projects.filter(
-            Q(title__icontains=search) |
-            Q(description__icontains=search) |
-            Q(short_description__icontains=search)
-        )
+        # Ranked full-text match; relevance order unless a sort is requested
+        projects = search_projects(projects, search)
 
     # Sorting
-    sort = request.GET.get('sort', '-created_at')
-    projects = projects.order_by(sort)
+    if sort or not search:
+        projects = projects.order_by(*PROJECT_SORTS[sort or DEFAULT_SORT])
+
+    # Pagination: cursor based; numbered pages are kept for old links
+    if 'page' in request.GET:
+        paginator = Paginator(projects, 12)
+        return paginator.get_page(request.GET.get('page'))
+    paginator = KeysetPaginator(projects, 12)
+    return paginator.get_page(request.GET.get('cursor'))
 
-    # Pagination
-    paginator = Paginator(projects, 12)
-    page = request.GET.get('page')
-    projects = paginator.get_page(page)
 
-    trending_tags = Tag.objects.annotate(
-        project_count=Count('projects')
-    ).order_by('-project_count')[:15]
+def explore(request):
+    """Explore page with filters"""
+    # Facet filters; several values of one facet are ORed together
+    filters = {
+        'stage': request.GET.getlist('stage'),
+        'status': request.GET.getlist('status'),
+        'project_type': request.GET.getlist('project_type'),
+        'collaboration_needed': request.GET.getlist('collaboration'),
+        'user_type': request.GET.getlist('user_type'),
+        'tags': request.GET.getlist('tags'),
+    }
+    search = request.GET.get('search', '')
+    sort = resolve_sort(request.GET.get('sort', ''))
+
+    # Plain listings are cached per normalized query; search results carry snippets
+    cache_key = None
+    projects = None
+    if not search and 'page' not in request.GET:
+        params = request.GET.copy()
+        params['sort'] = sort or DEFAULT_SORT
+        cache_key = listing_cache_key('explore', params)
+        projects, extra = get_cached_page(cache_key)
+
+    if projects is not None:
+        facet_counts = extra['facet_counts']
+    else:
+        facet_counts = get_facet_index().counts(filters)
+        projects = _explore_page(request, filters, search, sort)
+        if cache_key:
+            set_cached_page(cache_key, projects, facet_counts=facet_counts)
+
+    if search:
+        for project in projects:
+            project.search_snippet = render_headline(project.search_headline)
+    # Per-viewer flags are never cached, the page is marked after hydration
+    attach_viewer_state(projects, request.user)
 
     context = {
         'projects': projects,
-        'trending_tags': trending_tags,
+        'trending_tags': trending_tags(15),
+        'next_page_query': _cursor_query(request, getattr(projects, 'next_cursor', None)),
+        'previous_page_query': _cursor_query(request, getattr(projects, 'previous_cursor', None)),
+        'next_api_url': _explore_api_url(request, getattr(projects, 'next_cursor', None)),
+        'result_count': getattr(projects, 'total', None),
+        'stage_options': _facet_options(Project.PROJECT_STAGES, facet_counts['stage'], filters['stage']),
+        'status_options': _facet_options(Project.PROJECT_STATUS, facet_counts['status'], filters['status']),
+        'collaboration_options': _facet_options(
+            Project.COLLABORATION_TYPES, facet_counts['collaboration_needed'], filters['collaboration_needed']
+        ),
         'user_types': User.USER_TYPES,
         'stages': Project.PROJECT_STAGES,
         'statuses': Project.PROJECT_STATUS,
@@ -84,16 +171,21 @@ def explore(request):
 @login_required
 def project_detail(request, slug):
     """Project detail page"""
-    project = get_object_or_404(Project, slug=slug)
-    project.views_count += 1
-    project.save(update_fields=['views_count'])
+    try:
+        project = Project.objects.get(slug=slug)
+    except Project.DoesNotExist:
+        # Only a miss pays for the former slug lookup
+        current_slug = current_project_slug(slug)
+        if current_slug is None:
+            raise Http404('No Project matches the given query.')
+        return redirect('project_detail', slug=current_slug, permanent=True)
+    record_project_view(request, project)
 
     comments = project.comments.filter(parent_comment=None)
     updates = project.updates.all()[:5]
     members = project.projectmembership_set.all()
 
-    is_member = request.user in project.members.all()
-    is_supporter = request.user in project.supporters.all()
+    attach_viewer_state([project], request.user)
     has_join_request = JoinRequest.objects.filter(
         user=request.user,
         project=project,
@@ -105,8 +197,8 @@ def project_detail(request, slug):
         'comments': comments,
         'updates': updates,
         'members': members,
-        'is_member': is_member,
-        'is_supporter': is_supporter,
+        'is_member': project.is_member,
+        'is_supporter': project.is_supported,
         'has_join_request': has_join_request,
     }
     return render(request, 'workstation/project_detail.html', context)
@@ -165,10 +257,10 @@ def edit_project(request, slug):
 def profile(request, username):
     """User profile page"""
     user = get_object_or_404(User, username=username)
-    created_projects = user.created_projects.all()
-    joined_projects = user.joined_projects.all()
+    created_projects = attach_viewer_state(user.created_projects.all(), request.user)
+    joined_projects = attach_viewer_state(user.joined_projects.all(), request.user)
     supported_projects = user.supported_projects.all()
-    recent_thoughts = user.thoughts.all()[:10]
+    recent_thoughts = attach_viewer_state(user.thoughts.all()[:10], request.user)
 
     context = {
         'profile_user': user,
@@ -307,27 +399,12 @@ def edit_profile(request):
 def support_project(request, slug):
     """Support/unsupport a project"""
     project = get_object_or_404(Project, slug=slug)
-
-    if request.user in project.supporters.all():
-        project.supporters.remove(request.user)
-        supported = False
-    else:
-        project.supporters.add(request.user)
-        supported = True
-
-        # Create notification
-        Notification.objects.create(
-            user=project.creator,
-            notification_type='support',
-            title=f'{request.user.username} supported your project',
-            content=f'{request.user.username} is now supporting {project.title}',
-            link=f'/projects/{project.slug}/'
-        )
+    supported, count = set_project_support(project, request.user)
 
     return JsonResponse({
         'success': True,
         'supported': supported,
-        'supporters_count': project.supporters.count()
+        'supporters_count': count
     })
 
 
@@ -438,24 +515,26 @@ def user_logout(request):
     return redirect('home')
 
 
-@login_required
-def messages_inbox(request):
-    """Messages inbox - list of all conversations"""
-    # Get all conversations for the current user
-    conversations = Conversation.objects.filter(
-        participants=request.user
-    ).select_related('last_message').order_by('-updated_at')
+INBOX_PER_PAGE = 30
+MESSAGES_PER_PAGE = 30
 
-    # Count unread messages
-    unread_count = Message.objects.filter(
-        recipient=request.user,
-        is_read=False
-    ).count()
 
-    context = {
-        'conversations': conversations,
-        'unread_count': unread_count,
+def _inbox_context(request, cursor=None):
+    """Sidebar conversations, one query per page of the inbox"""
+    page = KeysetPaginator(inbox(request.user), INBOX_PER_PAGE).get_page(cursor)
+    return {
+        'conversations': inbox_conversations(page, request.user),
+        'inbox_page': page,
+        'inbox_next_query': _cursor_query(request, page.next_cursor),
+        'inbox_previous_query': _cursor_query(request, page.previous_cursor),
+        'unread_count': unread_counts(request.user)['unread_messages'],
     }
+
+
+@login_required
+def messages_inbox(request):
+    """Messages inbox - list of all conversations"""
+    context = _inbox_context(request, request.GET.get('cursor'))
     return render(request, 'workstation/messages.html', context)
 
 
@@ -463,72 +542,37 @@ def messages_inbox(request):
 def conversation_detail(request, conversation_id):
     """View a specific conversation and send messages"""
     conversation = get_object_or_404(
-        Conversation,
-        id=conversation_id,
-        participants=request.user
+        Conversation.objects.filter(memberships__user=request.user).annotate(
+            deleted_through=F('memberships__deleted_through_message_id')
+        ).select_related('user_low', 'user_high', 'project'),
+        id=conversation_id
     )
-
-    # Get all messages in this conversation
-    other_user = conversation.participants.exclude(id=request.user.id).first()
-
-    messages_list = Message.objects.filter(
-        Q(sender=request.user, recipient=other_user) |
-        Q(sender=other_user, recipient=request.user)
-    ).order_by('created_at')
-
-    # Mark messages as read
-    Message.objects.filter(
-        recipient=request.user,
-        sender=other_user,
-        is_read=False
-    ).update(is_read=True, read_at=timezone.now())
+    other_user = conversation.get_other_user(request.user)
 
     # Handle new message submission
     if request.method == 'POST':
         content = request.POST.get('content', '').strip()
 
         if content:
-            message = Message.objects.create(
-                sender=request.user,
-                recipient=other_user,
-                content=content
-            )
-
-            # Update conversation
-            conversation.last_message = message
-            conversation.updated_at = timezone.now()
-            conversation.save()
-
-            # Create notification for recipient
-            Notification.objects.create(
-                user=other_user,
-                notification_type='message',
-                title='New message',
-                content=f'{request.user.username} sent you a message',
-                link=f'/conversations/{conversation.id}/'
-            )
-
+            post_message(conversation, request.user, other_user, content)
             messages.success(request, 'Message sent!')
             return redirect('conversation_detail', conversation_id=conversation.id)
         else:
             messages.error(request, 'Message cannot be empty')
 
-    # Get all conversations for sidebar
-    all_conversations = Conversation.objects.filter(
-        participants=request.user
-    ).select_related('last_message').order_by('-updated_at')
-
-    unread_count = Message.objects.filter(
-        recipient=request.user,
-        is_read=False
-    ).count()
+    # Latest messages first; `cursor` pages back through older ones
+    thread = thread_messages(conversation, conversation.deleted_through)
+    page = KeysetPaginator(thread, MESSAGES_PER_PAGE).get_page(request.GET.get('cursor'))
+    mark_conversation_read(request.user, conversation)
 
     context = {
+        **_inbox_context(request),
         'conversation': conversation,
-        'conversations': all_conversations,
-        'messages': messages_list,
+        'messages': page.object_list[::-1],
+        'page': page,
+        'older_messages_query': _cursor_query(request, page.next_cursor),
+        'newer_messages_query': _cursor_query(request, page.previous_cursor),
         'other_user': other_user,
-        'unread_count': unread_count,
     }
     return render(request, 'workstation/messages.html', context)
 
@@ -550,37 +594,8 @@ def send_message(request, username):
             messages.error(request, 'Message content is required')
             return redirect('send_message', username=username)
 
-        # Create the message
-        message = Message.objects.create(
-            sender=request.user,
-            recipient=recipient,
-            subject=subject,
-            content=content
-        )
-
-        # Get or create conversation
-        conversation = Conversation.objects.filter(
-            participants=request.user
-        ).filter(
-            participants=recipient
-        ).first()
-
-        if not conversation:
-            conversation = Conversation.objects.create()
-            conversation.participants.add(request.user, recipient)
-
-        conversation.last_message = message
-        conversation.updated_at = timezone.now()
-        conversation.save()
-
-        # Create notification
-        Notification.objects.create(
-            user=recipient,
-            notification_type='message',
-            title='New message',
-            content=f'{request.user.username} sent you a message',
-            link=f'/conversations/{conversation.id}/'
-        )
+        conversation = get_or_create_conversation(request.user, recipient)
+        post_message(conversation, request.user, recipient, content, subject=subject)
 
         messages.success(request, f'Message sent to {recipient.username}!')
         return redirect('conversation_detail', conversation_id=conversation.id)
@@ -592,16 +607,45 @@ def send_message(request, username):
 
 
 @login_required
-def notifications(request):
-    """View all notifications"""
-    # Get all notifications for the current user
-    notifications = request.user.notifications.all().order_by('-created_at')
+def project_conversation(request, slug):
+    """Open the team conversation of a project the user is a member of"""
+    project = get_object_or_404(Project, slug=slug)
+    if not ProjectMembership.objects.filter(project=project, user=request.user).exists():
+        messages.error(request, 'Only team members can message the team')
+        return redirect('project_detail', slug=slug)
+
+    conversation = get_or_create_project_conversation(project)
+    return redirect('conversation_detail', conversation_id=conversation.id)
+
 
-    # Mark notifications as read when viewed
-    notifications.filter(is_read=False).update(is_read=True)
+NOTIFICATIONS_PER_PAGE = 20
 
+
+@login_required
+def notifications(request):
+    """Notification center, a cursor-paginated page grouped by day"""
+    watermark = unread_counts(request.user)['notifications_read_through']
+    paginator = KeysetPaginator(request.user.notifications.order_by('-created_at'), NOTIFICATIONS_PER_PAGE)
+    page = paginator.get_page(request.GET.get('cursor'))
+    for notification in page:
+        notification.unread = not notification.is_read and notification.pk > watermark
+
+    # Viewing the newest page reads what it shows; the flags above still show what was new
+    if not page.has_previous() and page:
+        advance_notification_watermark(request.user, shown=[notification.pk for notification in page])
+
+    today = timezone.localdate()
+    days = [
+        (day, list(items))
+        for day, items in groupby(page, key=lambda notification: timezone.localdate(notification.created_at))
+    ]
     context = {
-        'notifications': notifications,
+        'page': page,
+        'days': days,
+        'today': today,
+        'yesterday': today - timedelta(days=1),
+        'next_page_query': _cursor_query(request, page.next_cursor),
+        'previous_page_query': _cursor_query(request, page.previous_cursor),
     }
     return render(request, 'workstation/notifications.html', context)
 
@@ -642,13 +686,14 @@ def dashboard(request):
     ).order_by('-projectmembership__joined_at')[:5]
 
     # Get recent messages
-    recent_messages = Message.objects.filter(
+    recent_messages = visible_messages(Message.objects.filter(
         recipient=request.user
-    ).select_related('sender').order_by('-created_at')[:5]
+    ), request.user).select_related('sender').order_by('-created_at')[:5]
 
     # Get unread notifications
-    unread_notifications = request.user.notifications.filter(
-        is_read=False
+    unread = unread_counts(request.user)
+    recent_unread = unread_notifications(
+        request.user, unread['notifications_read_through']
     ).order_by('-created_at')[:10]
 
     # Get stats
@@ -656,11 +701,8 @@ def dashboard(request):
         'projects_created': request.user.created_projects.count(),
         'projects_joined': request.user.joined_projects.count(),
         'projects_supported': request.user.supported_projects.count(),
-        'unread_messages': Message.objects.filter(
-            recipient=request.user,
-            is_read=False
-        ).count(),
-        'unread_notifications': unread_notifications.count(),
+        'unread_messages': unread['unread_messages'],
+        'unread_notifications': unread['unread_notifications'],
     }
 
     # Get recent activity (join requests, comments, etc.)
@@ -673,7 +715,7 @@ def dashboard(request):
         'my_projects': my_projects,
         'joined_projects': joined_projects,
         'recent_messages': recent_messages,
-        'notifications': unread_notifications,
+        'notifications': recent_unread,
         'stats': stats,
         'join_requests': recent_join_requests,
     }
@@ -690,8 +732,7 @@ def mark_notification_read(request, notification_id):
             id=notification_id,
             user=request.user
         )
-        notification.is_read = True
-        notification.save()
+        mark_notifications_read(request.user, Notification.objects.filter(pk=notification.pk))
 
         return JsonResponse({'success': True})
     return JsonResponse({'success': False}, status=400)
@@ -702,7 +743,7 @@ def mark_notification_read(request, notification_id):
 def mark_all_notifications_read(request):
     """Mark all notifications as read"""
     if request.method == 'POST':
-        count = request.user.notifications.filter(is_read=False).update(is_read=True)
+        count = advance_notification_watermark(request.user)
         return JsonResponse({'success': True, 'count': count})
     return JsonResponse({'success': False}, status=400)
 
@@ -725,38 +766,15 @@ def delete_message(request, message_id):
 # API endpoint for deleting a conversation
 @login_required
 def delete_conversation(request, conversation_id):
-    """Delete a conversation"""
+    """Delete a conversation for the current user; the other participants keep it"""
     if request.method == 'POST':
         conversation = get_object_or_404(
             Conversation,
             id=conversation_id,
             participants=request.user
         )
-
-        # Delete all messages in this conversation
-        other_user = conversation.participants.exclude(id=request.user.id).first()
-        Message.objects.filter(
-            Q(sender=request.user, recipient=other_user) |
-            Q(sender=other_user, recipient=request.user)
-        ).delete()
-
-        conversation.delete()
+        delete_conversation_for(conversation, request.user)
         messages.success(request, 'Conversation deleted')
         return redirect('messages')
     return redirect('messages')
 
-
-# Helper function to create a conversation between two users
-def get_or_create_conversation(user1, user2):
-    """Get existing conversation or create new one"""
-    conversation = Conversation.objects.filter(
-        participants=user1
-    ).filter(
-        participants=user2
-    ).first()
-
-    if not conversation:
-        conversation = Conversation.objects.create()
-        conversation.participants.add(user1, user2)
-
-    return conversation